@@ -1,24 +1,83 @@
 """Game dictionary and related classes."""
 
 from __future__ import annotations
-from collections.abc import Sequence
+from collections.abc import Iterable, Iterator, Sequence
+import hashlib
+import json
+import os
 from pathlib import Path
+from weakref import WeakValueDictionary
 
-from lbsolve.type_defs import Letter, UniqueCount
+from lbsolve.type_defs import Letter, LetterMask, UniqueCount
 
 
 MIN_LETTERS_IN_WORD = 3
+LETTERS_IN_ALPHABET = 26
+# A word can't have more unique letters than there are in the alphabet.
+UNIQUE_COUNT_SLOTS = LETTERS_IN_ALPHABET + 1
+# Bump when the cache file layout or the meaning of a valid word changes.
+CACHE_VERSION = 1
+ORD_A = ord("a")
+# The bit of each letter, so building a mask skips the ord and shift per letter.
+_LETTER_BITS = {chr(ORD_A + bit): 1 << bit for bit in range(LETTERS_IN_ALPHABET)}
+
+
+def letter_mask(letters: Iterable[Letter]) -> LetterMask:
+    """
+    Encodes letters as a bitmask, where bit i is set if chr(ord('a') + i) is
+    present.
+
+    Args:
+      letters: Lowercase letters to encode.
+
+    Returns: The bitmask of the letters.
+    """
+    letter_bits = _LETTER_BITS
+    mask = 0
+    for letter in letters:
+        mask |= letter_bits[letter]
+    return mask
+
+
+def mask_letters(mask: LetterMask) -> frozenset[Letter]:
+    """
+    Decodes a bitmask created by `letter_mask` back into letters.
+
+    Args:
+      mask: The bitmask to decode.
+
+    Returns: The letters set in the bitmask.
+    """
+    return frozenset(
+        chr(ORD_A + bit) for bit in range(LETTERS_IN_ALPHABET) if mask >> bit & 1
+    )
 
 
 class Word:
-    """Represents a single dictionary word."""
+    """
+    Represents a single dictionary word.
+
+    Words are interned: creating a word from a string that already has a live
+    Word returns that same instance. Equal words are therefore always
+    identical, so words compare and hash by identity.
+    """
+
+    __slots__ = (
+        "_word",
+        "first_letter",
+        "last_letter",
+        "mask",
+        "unique_count",
+        "__weakref__",
+    )
 
     _word: str
     first_letter: str
     last_letter: str
-    unique_letters: frozenset[Letter]
+    mask: LetterMask
+    unique_count: UniqueCount
 
-    def __init__(self, word: str) -> None:
+    def __new__(cls, word: str) -> Word:
         """
         Args:
           word: A single word.
@@ -27,10 +86,32 @@ class Word:
             raise TypeError(
                 f"'word' should be type 'str', not '{type(word).__name__}'."
             )
+        self = _word_pool.get(word)
+        if self is not None:
+            return self
+        try:
+            mask = letter_mask(word)
+        except KeyError:
+            raise ValueError(
+                f"'word' should only contain the letters a to z, not '{word}'."
+            ) from None
+        self = super().__new__(cls)
         self._word = word
-        self.first_letter = self._word[0]
-        self.last_letter = self._word[-1]
-        self.unique_letters = frozenset(word)
+        self.first_letter = word[0]
+        self.last_letter = word[-1]
+        self.mask = mask
+        self.unique_count = mask.bit_count()
+        _word_pool[word] = self
+        return self
+
+    def __reduce__(self) -> tuple[type[Word], tuple[str]]:
+        # Copies and unpickled words go through the pool too.
+        return Word, (self._word,)
+
+    @property
+    def unique_letters(self) -> frozenset[Letter]:
+        """The distinct letters in the word."""
+        return mask_letters(self.mask)
 
     def __str__(self) -> str:
         return self._word
@@ -38,11 +119,8 @@ class Word:
     def __repr__(self) -> str:
         return f"Word({self._word})"
 
-    def __eq__(self, other) -> bool:
-        return self._word == other._word
-
-    def __hash__(self) -> int:
-        return self._word.__hash__()
+    def __len__(self) -> int:
+        return len(self._word)
 
     @staticmethod
     def factory(*words: str) -> list[Word]:
@@ -55,9 +133,14 @@ class Word:
         return [Word(word) for word in words]
 
 
+_word_pool: WeakValueDictionary[str, Word] = WeakValueDictionary()
+
+
 class WordSequence(Sequence):
     """Represents a series of words."""
 
+    __slots__ = ("_word_sequence",)
+
     _word_sequence: tuple[Word]
 
     def __init__(self, *words: Word) -> None:
@@ -68,7 +151,9 @@ class WordSequence(Sequence):
         super().__init__()
         if not words:
             raise IndexError("One or more word expected.")
-        if not isinstance(words[0], Word):
+        # The solver builds sequences from dictionary words, so the type check is
+        # only run in debug mode and is stripped by `python -O`.
+        if __debug__ and not isinstance(words[0], Word):
             raise TypeError(
                 f"'words' should be instances of type 'Word', "
                 f"not '{type(words[0]).__name__}'."
@@ -81,9 +166,20 @@ class WordSequence(Sequence):
     def __getitem__(self, index) -> Word:
         return self._word_sequence[index]
 
+    # The Sequence mixins iterate by calling __getitem__ until IndexError; the
+    # underlying tuple does the same work in C.
+    def __iter__(self) -> Iterator[Word]:
+        return iter(self._word_sequence)
+
+    def __contains__(self, value: object) -> bool:
+        return value in self._word_sequence
+
     def __eq__(self, other: object) -> bool:
         return self._word_sequence == other._word_sequence
 
+    def __hash__(self) -> int:
+        return hash(self._word_sequence)
+
 
 class GameDictionary:
     """The dictionary of all valid words for the game. A subset of the input
@@ -91,13 +187,27 @@ class GameDictionary:
 
     word_list_file: Path
     letter_groups: tuple[tuple[Letter, 3], 4]
+    letter_groups_masks: tuple[LetterMask, 4]
+    allowed_next: list[LetterMask]
+    _letter_candidates: dict[Letter, frozenset[Letter]]
+    _game_letters: frozenset[Letter]
+    merge_equivalent_words: bool
     valid_words: int
     invalid_words: int
-    _words_by_first_letter: dict[Letter, dict[UniqueCount, str]]
-    _words_by_uniques: dict[UniqueCount, dict[Letter, str]]
+    equivalent_words: int
+    # Indexed by [first letter index][unique count]
+    _words_by_first_letter: list[list[list[Word]]]
+    # Indexed by [unique count][first letter index]
+    _words_by_uniques: list[list[list[Word]]]
+    # Flattened views of the indexes, built on first use.
+    _ordered_by_uniques: list[Word] | None
+    _ordered_by_first_letter: list[Word] | None
 
     def __init__(
-        self, word_list_file: Path, game_letter_groups: tuple[tuple[Letter, 3], 4]
+        self,
+        word_list_file: Path,
+        game_letter_groups: tuple[tuple[Letter, 3], 4],
+        merge_equivalent_words: bool = True,
     ) -> None:
         """
         Args:
@@ -105,13 +215,30 @@ class GameDictionary:
             game. Each word should be on its own line.
         game_letter_groups: Four tuples, each containing three letters. Each tuple
         represents one side of the "letter box".
+        merge_equivalent_words: If true, words with the same first letter, last
+          letter and unique letters are interchangeable in a solution, so only the
+          shortest of them is kept.
         """
         self.word_list_file = word_list_file
         self.letter_groups = self._normalize_letter_groups(game_letter_groups)
+        self.letter_groups_masks = tuple(
+            letter_mask(letter_group) for letter_group in self.letter_groups
+        )
+        self.allowed_next = self._build_allowed_next(self.letter_groups_masks)
+        self._letter_candidates = self._build_letter_candidates(self.letter_groups)
+        self._game_letters = self._letter_candidates[""]
+        self.merge_equivalent_words = merge_equivalent_words
         self.valid_words = 0
         self.invalid_words = 0
-        self._words_by_first_letter = {}
-        self._words_by_uniques = {}
+        self.equivalent_words = 0
+        self._words_by_first_letter = [
+            [[] for _ in range(UNIQUE_COUNT_SLOTS)] for _ in range(LETTERS_IN_ALPHABET)
+        ]
+        self._words_by_uniques = [
+            [[] for _ in range(LETTERS_IN_ALPHABET)] for _ in range(UNIQUE_COUNT_SLOTS)
+        ]
+        self._ordered_by_uniques = None
+        self._ordered_by_first_letter = None
 
     @staticmethod
     def _normalize_letter_groups(
@@ -129,9 +256,66 @@ class GameDictionary:
             normalize_letter_groups.append(
                 tuple(letter.lower() for letter in letter_group)
             )
+            for letter in normalize_letter_groups[-1]:
+                # Letter masks and the per-letter tables only have a bit for
+                # each of a to z.
+                if letter not in _LETTER_BITS:
+                    raise ValueError(
+                        f"Letter groups may only contain the letters a to z, "
+                        f"not {letter!r}."
+                    )
         return tuple(normalize_letter_groups)
 
-    def get_letter_candidates(self, current_letter="") -> list[Letter]:
+    @staticmethod
+    def _build_allowed_next(
+        letter_groups_masks: tuple[LetterMask, 4],
+    ) -> list[LetterMask]:
+        """
+        Builds a table of the letters that may follow each letter.
+
+        Args:
+          letter_groups_masks: The bitmask of each side of the letter box.
+
+        Returns: For each letter index, the bitmask of letters on the other sides.
+          Letters that are not in the game have no valid followers.
+        """
+        allowed_next = [0] * LETTERS_IN_ALPHABET
+        for bit in range(LETTERS_IN_ALPHABET):
+            letter_bit = 1 << bit
+            if not any(letter_bit & group_mask for group_mask in letter_groups_masks):
+                continue
+            for group_mask in letter_groups_masks:
+                if not letter_bit & group_mask:
+                    allowed_next[bit] |= group_mask
+        return allowed_next
+
+    @staticmethod
+    def _build_letter_candidates(
+        letter_groups: tuple[tuple[Letter, 3], 4],
+    ) -> dict[Letter, frozenset[Letter]]:
+        """
+        Precomputes the letter candidates for every game letter.
+
+        Args:
+          letter_groups: The normalized letter groups.
+
+        Returns: The letters on other sides, keyed by game letter. The empty
+          string maps to all game letters.
+        """
+        all_letters = frozenset(
+            letter for letter_group in letter_groups for letter in letter_group
+        )
+        letter_candidates = {"": all_letters}
+        for current_letter in all_letters:
+            letter_candidates[current_letter] = frozenset(
+                letter
+                for letter_group in letter_groups
+                if current_letter not in letter_group
+                for letter in letter_group
+            )
+        return letter_candidates
+
+    def get_letter_candidates(self, current_letter="") -> frozenset[Letter]:
         """Returns letters on sides of the letter box that don't contain
         the given letter. If no letter is given it returns all letters.
 
@@ -141,12 +325,8 @@ class GameDictionary:
 
         Returns: Valid letters.
         """
-        candidates = []
-        for letter_group in self.letter_groups:
-            if current_letter in letter_group:
-                continue
-            candidates.extend(letter_group)
-        return candidates
+        letter_candidates = self._letter_candidates
+        return letter_candidates.get(current_letter, letter_candidates[""])
 
     def word_is_valid(self, word: str) -> bool:
         """Tests that word can be used in game.
@@ -157,76 +337,189 @@ class GameDictionary:
         Returns: If the word can be used in the game."""
         if len(word) < MIN_LETTERS_IN_WORD:
             return False
-        if word[0] not in self.get_letter_candidates():
+        # Most dictionary words contain a letter that isn't in the game. This
+        # rejects them in one pass in C, and leaves only game letters for the
+        # adjacency loop.
+        if not self._game_letters.issuperset(word):
             return False
-        for prev_index, word_letter in enumerate(word[1:]):
-            if word_letter not in self.get_letter_candidates(word[prev_index]):
+        allowed_next = self.allowed_next
+        prev = ord(word[0]) - ORD_A
+        for word_letter in word[1:]:
+            current = ord(word_letter) - ORD_A
+            if not allowed_next[prev] >> current & 1:
                 return False
+            prev = current
         return True
 
-    def _add_word_to_words_by_first_letter(self, word: Word) -> None:
+    def _index_word(self, word: Word) -> None:
+        """
+        Adds the word to both the words-by-first-letter and the
+        words-by-unique-letters data structures.
+
+        Args:
+          word: The word to add.
+        """
+        first_letter_index = ord(word.first_letter) - ORD_A
+        unique_count = word.unique_count
+        self._words_by_first_letter[first_letter_index][unique_count].append(word)
+        self._words_by_uniques[unique_count][first_letter_index].append(word)
+        self._ordered_by_first_letter = None
+        self._ordered_by_uniques = None
+
+    def _read_word_lines(self) -> list[str]:
+        """
+        Reads the word list file in one pass. The whole file is lowercased at
+        once so the per-line work is just the validity check.
+
+        Returns: The lowercased lines of the word list file.
+        """
+        # A single read also works for pipes and other files with no size.
+        data = self.word_list_file.read_bytes()
+        # Most word lists are already lowercase, in which case there's no need to
+        # copy the whole buffer.
+        if not data.islower():
+            data = data.lower()
+        # Game letters are all ascii, so words with any other character can never
+        # be valid. Replacing those bytes is much cheaper than a full utf-8 decode.
+        return data.decode("ascii", errors="replace").splitlines()
+
+    def cache_path(self, cache_dir: Path) -> Path:
         """
-        Adds the word to the words-by-first-letter data structure.
+        Get the file a created game dictionary is cached in. The name changes
+        whenever the word file is modified or the puzzle settings differ.
 
         Args:
-          word: THe word to add.
+          cache_dir: The directory holding the cache files.
+
+        Returns: The path of the cache file.
         """
-        first_letter_group = self._words_by_first_letter.setdefault(
-            word.first_letter, {}
+        stat = self.word_list_file.stat()
+        key = json.dumps(
+            [
+                CACHE_VERSION,
+                str(self.word_list_file.resolve()),
+                stat.st_mtime_ns,
+                stat.st_size,
+                self.letter_groups,
+                self.merge_equivalent_words,
+            ]
         )
-        uniques_group = first_letter_group.setdefault(word.unique_letters, [])
-        uniques_group.append(word)
+        return Path(cache_dir) / f"{hashlib.sha256(key.encode()).hexdigest()}.json"
 
-    def _add_word_to_words_by_uniques(self, word: Word) -> None:
+    def _load_cache(self, cache_file: Path) -> bool:
+        try:
+            with open(cache_file, encoding="ascii") as cache:
+                cached = json.load(cache)
+            if cached["version"] != CACHE_VERSION:
+                return False
+            valid_words = int(cached["valid_words"])
+            invalid_words = int(cached["invalid_words"])
+            equivalent_words = int(cached["equivalent_words"])
+            words = [Word(raw_word) for raw_word in cached["words"]]
+        except (OSError, KeyError, IndexError, TypeError, ValueError):
+            # A damaged cache is rebuilt from the word file.
+            return False
+        self.valid_words = valid_words
+        self.invalid_words = invalid_words
+        self.equivalent_words = equivalent_words
+        self._index_words(words)
+        return True
+
+    def _save_cache(self, cache_file: Path, words: list[Word]) -> None:
+        cached = {
+            "version": CACHE_VERSION,
+            "valid_words": self.valid_words,
+            "invalid_words": self.invalid_words,
+            "equivalent_words": self.equivalent_words,
+            "words": [str(word) for word in words],
+        }
+        try:
+            cache_file.parent.mkdir(parents=True, exist_ok=True)
+            # Write then rename so a concurrent run never reads a partial file.
+            partial_file = cache_file.with_suffix(f".{os.getpid()}.tmp")
+            with open(partial_file, "w", encoding="ascii") as cache:
+                json.dump(cached, cache)
+            os.replace(partial_file, cache_file)
+        except OSError:
+            pass
+
+    def _index_words(self, words: Iterable[Word]) -> None:
+        for word in words:
+            self._index_word(word)
+
+    def create(self, cache_dir: Path | None = None) -> None:
         """
-        Adds the word to the words-by-unique-letters data structure.
+        Creates the game dictionary.
 
         Args:
-          word: THe word to add.
-        """
-        uniques_group = self._words_by_uniques.setdefault(len(word.unique_letters), {})
-        first_letter_group = uniques_group.setdefault(word.first_letter, [])
-        first_letter_group.append(word)
-
-    def create(self) -> None:
-        """Creates the game dictionary."""
-        with self.word_list_file.open(mode="r") as word_list:
-            for word_line in word_list:
-                raw_word = word_line.strip().lower()
-                if not self.word_is_valid(raw_word):
-                    self.invalid_words += 1
-                    continue
-                word = Word(raw_word)
-                self._add_word_to_words_by_first_letter(word)
-                self._add_word_to_words_by_uniques(word)
-                self.valid_words += 1
+          cache_dir: Optional directory to cache the created dictionary in.
+            A cache file matching the word file and puzzle is loaded instead
+            of reading the word file, otherwise one is written afterwards.
+        """
+        cache_file = None
+        if cache_dir is not None:
+            cache_file = self.cache_path(cache_dir)
+            if self._load_cache(cache_file):
+                return
+        words = []
+        representatives = {}
+        for word_line in self._read_word_lines():
+            # Stripping can only shorten the line, so short lines can be
+            # rejected without doing any work on them.
+            if len(word_line) < MIN_LETTERS_IN_WORD:
+                self.invalid_words += 1
+                continue
+            raw_word = word_line.strip()
+            if not self.word_is_valid(raw_word):
+                self.invalid_words += 1
+                continue
+            self.valid_words += 1
+            word = Word(raw_word)
+            if not self.merge_equivalent_words:
+                words.append(word)
+                continue
+            key = (word.first_letter, word.last_letter, word.mask)
+            representative = representatives.get(key)
+            if representative is None or len(word) < len(representative):
+                representatives[key] = word
+        if self.merge_equivalent_words:
+            words = list(representatives.values())
+            self.equivalent_words = self.valid_words - len(words)
+        self._index_words(words)
+        if cache_file is not None:
+            self._save_cache(cache_file, words)
 
     def ordered_by_uniques(self) -> list[Word]:
         """
         Get all words in the game dictionary, ordered by the number of unique
-        letters.
+        letters. The list is shared between calls and must not be modified.
 
         Returns: The list of game words.
         """
-        words_by_uniques = []
-        for first_letters_groups in self._words_by_uniques.values():
-            for first_letter_group in first_letters_groups.values():
-                for word in first_letter_group:
-                    words_by_uniques.append(word)
-        return words_by_uniques
+        if self._ordered_by_uniques is None:
+            self._ordered_by_uniques = [
+                word
+                for first_letter_groups in self._words_by_uniques
+                for first_letter_group in first_letter_groups
+                for word in first_letter_group
+            ]
+        return self._ordered_by_uniques
 
     def ordered_by_first_letter(self) -> list[Word]:
         """
-        Get all words in the game dictionary, ordered by the first letter.
+        Get all words in the game dictionary, ordered by the first letter. The
+        list is shared between calls and must not be modified.
 
         Returns: The list of game words.
         """
-        words_by_first_letter = []
-        for uniques_groups in self._words_by_first_letter.values():
-            for uniques_group in uniques_groups.values():
-                for word in uniques_group:
-                    words_by_first_letter.append(word)
-        return words_by_first_letter
+        if self._ordered_by_first_letter is None:
+            self._ordered_by_first_letter = [
+                word
+                for uniques_groups in self._words_by_first_letter
+                for uniques_group in uniques_groups
+                for word in uniques_group
+            ]
+        return self._ordered_by_first_letter
 
     def get_words_with_first_letter(self, lookup: Letter) -> list[Word]:
         """
@@ -237,8 +530,13 @@ class GameDictionary:
 
         Returns: Matching words.
         """
-        words_by_uniques = self._words_by_first_letter.get(lookup, {})
-        return [word for words in words_by_uniques.values() for word in words]
+        if len(lookup) != 1:
+            return []
+        first_letter_index = ord(lookup) - ORD_A
+        if not 0 <= first_letter_index < LETTERS_IN_ALPHABET:
+            return []
+        words_by_uniques = self._words_by_first_letter[first_letter_index]
+        return [word for words in words_by_uniques for word in words]
 
     def get_words_with_uniques(self, lookup: UniqueCount) -> list[Word]:
         """
@@ -249,5 +547,7 @@ class GameDictionary:
 
         Returns: Matching words.
         """
-        words_by_last_letter = self._words_by_uniques.get(lookup, {})
-        return [word for words in words_by_last_letter.values() for word in words]
+        if not 0 <= lookup < UNIQUE_COUNT_SLOTS:
+            return []
+        words_by_first_letter = self._words_by_uniques[lookup]
+        return [word for words in words_by_first_letter for word in words]
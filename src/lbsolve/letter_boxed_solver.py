@@ -1,5 +1,6 @@
 """Takes CLI arguments and runs the solution finder.x"""
 from argparse import ArgumentParser
+import logging
 from pathlib import Path
 import time
 
@@ -36,22 +37,81 @@ def main():
         required=False,
         help="Max consecutive words in a solution. 0 for any.",
     )
+    arg_parser.add_argument(
+        "--keep_equivalent_words",
+        action="store_true",
+        help="Keep every word instead of only the shortest word for each first "
+        "letter, last letter and set of unique letters.",
+    )
+    arg_parser.add_argument(
+        "--merge_equivalent_sequences",
+        action="store_true",
+        help="Only extend one word sequence for each last letter and set of "
+        "unique letters. Much faster, but only some solutions are listed.",
+    )
+    arg_parser.add_argument(
+        "--beam_width",
+        type=int,
+        default=0,
+        required=False,
+        help="Only extend this many word sequences per last letter in each pass, "
+        "preferring those with the most unique letters. Bounds the search, but "
+        "may miss solutions. 0 for no limit.",
+    )
+    arg_parser.add_argument(
+        "--shortest_only",
+        action="store_true",
+        help="Only search for the solutions with the fewest words. Uses far less "
+        "memory than the full search.",
+    )
+    arg_parser.add_argument(
+        "--cache_dir",
+        type=Path,
+        default=None,
+        required=False,
+        help="Directory to cache the game dictionary in, so repeat runs of the "
+        "same puzzle skip reading the word file. e.g. ~/.cache/lbsolve",
+    )
+    arg_parser.add_argument(
+        "--verbose",
+        action="store_true",
+        help="Log the solver's progress while it searches.",
+    )
 
     args = arg_parser.parse_args()
+    logging.basicConfig(
+        level=logging.DEBUG if args.verbose else logging.WARNING,
+        format="%(message)s",
+    )
 
     start = time.time()
     print("creating game dictionary from file...", end="")
-    game_dictionary = GameDictionary(args.word_file, args.letter_groups)
-    game_dictionary.create()
+    try:
+        game_dictionary = GameDictionary(
+            args.word_file,
+            args.letter_groups,
+            merge_equivalent_words=not args.keep_equivalent_words,
+        )
+    except ValueError as error:
+        arg_parser.error(str(error))
+    game_dictionary.create(args.cache_dir.expanduser() if args.cache_dir else None)
     # TODO: Add blacklist
     print(f"done in {time.time() - start:.3f} seconds")
     print(
         f"from {game_dictionary.valid_words + game_dictionary.invalid_words} "
         f"input words found {game_dictionary.valid_words} valid words"
     )
+    if game_dictionary.equivalent_words:
+        print(f"merged {game_dictionary.equivalent_words} equivalent words")
 
     print("Searching for solutions...", end="")
-    solver = SolutionFinder(game_dictionary, args.max_depth)
+    solver = SolutionFinder(
+        game_dictionary,
+        args.max_depth,
+        beam_width=args.beam_width,
+        merge_equivalent_candidates=args.merge_equivalent_sequences,
+        shortest_only=args.shortest_only,
+    )
     solver.start()
     while solver.running():
         try:
@@ -83,10 +143,16 @@ def main():
         print(solution)
     if not solutions:
         print("No solutions found!")
-        unique_counts = (
-            solver._solution_candidates.candidates_by_last_letter_by_uniques.keys()
+        max_letters = max(
+            (
+                candidate.unique_count
+                for candidate in solver._solution_candidates.linear_candidates
+            ),
+            default=0,
         )
-        max_letters = max(unique_counts) if unique_counts else 0
         if not max_letters:
             return
-        print(f"closest attempt: {solver._solution_candidates[max_letters][0]}")
+        closest = next(
+            solver._solution_candidates.candidates_with_unique_count(max_letters)
+        )
+        print(f"closest attempt: {closest}")
@@ -1,86 +1,164 @@
 """Class to find new solutions and data structures to aid in representation."""
 from __future__ import annotations
-from collections import OrderedDict
-from collections.abc import Mapping
-from copy import deepcopy
-from threading import Lock, Thread
+from bisect import insort
+from collections.abc import Iterator, Mapping
+from heapq import nlargest
+from itertools import chain
+import logging
+from threading import Thread
 import time
-from typing import Generator, Iterable
+from typing import Iterable
 
-from lbsolve.game_dictionary import GameDictionary, Word, WordSequence
-from lbsolve.type_defs import Letter, UniqueCount, WordCount
+from lbsolve.game_dictionary import GameDictionary, Word, WordSequence, mask_letters
+from lbsolve.type_defs import Letter, LetterMask, UniqueCount, WordCount
+
+logger = logging.getLogger(__name__)
 
 
 class PartialSolution:
     """
     Represents a series of words that do not use all game letters.
 
+    A partial solution made by `clone_and_extend` only points at its parent and
+    the added word, so extending costs the same at any depth. The full word
+    sequence is built the first time it is needed.
+
     This class is write-once
     """
 
-    sequence: WordSequence
+    __slots__ = (
+        "last_letter",
+        "mask",
+        "unique_count",
+        "depth",
+        "_parent",
+        "_word",
+        "_sequence",
+        "_hash",
+    )
+
     last_letter: str
-    unique_letters: frozenset
+    mask: LetterMask
+    unique_count: UniqueCount
+    depth: WordCount
+    _parent: PartialSolution | None
+    _word: Word
+    # None until built from the parent chain.
+    _sequence: WordSequence | None
+    # Folded word by word so a child's hash needs only its parent's.
+    _hash: int
 
     def __init__(self, sequence: WordSequence) -> None:
         """
         Args:
           sequence: The sequence of words in the partial solution.
         """
-        self.sequence = sequence
-        self.last_letter = sequence[-1].last_letter
-        self.unique_letters = frozenset(
-            letter for word in sequence for letter in word.unique_letters
-        )
+        self._sequence = sequence
+        self._parent = None
+        self._word = sequence[-1]
+        self.depth = len(sequence)
+        self.last_letter = self._word.last_letter
+        mask = 0
+        sequence_hash = 0
+        for word in sequence:
+            mask |= word.mask
+            sequence_hash = hash((sequence_hash, word))
+        self.mask = mask
+        self.unique_count = mask.bit_count()
+        self._hash = sequence_hash
+
+    @property
+    def sequence(self) -> WordSequence:
+        """The words in the partial solution."""
+        if self._sequence is None:
+            words = []
+            node = self
+            while node._sequence is None:
+                words.append(node._word)
+                node = node._parent
+            words.reverse()
+            self._sequence = WordSequence(*node._sequence, *words)
+        return self._sequence
+
+    @property
+    def unique_letters(self) -> frozenset[Letter]:
+        """The distinct letters in the partial solution."""
+        return mask_letters(self.mask)
+
+    def contains_word(self, word: Word) -> bool:
+        """
+        Check if a word is in the partial solution, without building its
+        sequence.
+
+        Args:
+          word: The word to look for.
+
+        Returns: If the word is in the partial solution.
+        """
+        node = self
+        while node._sequence is None:
+            if node._word is word:
+                return True
+            node = node._parent
+        return word in node._sequence
 
     def __len__(self) -> int:
-        return len(self.sequence)
+        return self.depth
 
-    def clone_and_extend(self, word: Word) -> WordSequence:
-        """Creates a new word sequence equal to self + word.
+    def clone_and_extend(self, word: Word) -> PartialSolution:
+        """Creates a new partial solution equal to self + word.
 
         Args:
           word: The new word to add to the sequence
 
-        Returns: The new sequence of words."""
+        Returns: The new partial solution."""
         if self.last_letter and self.last_letter != word.first_letter:
             raise ValueError(
                 "First letter of new word does not match last letter of last word"
             )
-        return PartialSolution(WordSequence(*self.sequence, word))
+        child = PartialSolution.__new__(PartialSolution)
+        child._sequence = None
+        child._parent = self
+        child._word = word
+        child.depth = self.depth + 1
+        child.last_letter = word.last_letter
+        child.mask = self.mask | word.mask
+        child.unique_count = child.mask.bit_count()
+        child._hash = hash((self._hash, word))
+        return child
 
     def __eq__(self, other: PartialSolution) -> bool:
-        return self.sequence == other.sequence
+        return self._hash == other._hash and self.sequence == other.sequence
+
+    def __hash__(self) -> int:
+        return self._hash
 
     def __str__(self) -> str:
-        words = []
-        for word in self.sequence:
-            word_str = str(word)
-            words.append(word_str)
-        words = [str(word) for word in self.sequence]
-        joined = "-".join(words)
-        return joined
+        return "-".join(map(str, self.sequence))
 
 
 class PartialSolutionMap(Mapping):
     """
     Data structure that provides various access methods to partial solutions.
+
+    Partial solutions are only indexed by last letter and letter mask. Lookups
+    by unique letter count filter the mask buckets, of which there are far
+    fewer than partial solutions.
     """
 
-    candidates_by_uniques_by_last_letter: dict[
-        Letter, dict[UniqueCount, list[PartialSolution]]
-    ]
-    candidates_by_last_letter_by_uniques: dict[
-        UniqueCount, dict[Letter, list[PartialSolution]]
+    candidates_by_mask_by_last_letter: dict[
+        Letter, dict[LetterMask, list[PartialSolution]]
     ]
     linear_candidates: list[PartialSolution]
+    # The same candidates as linear_candidates, for constant time membership.
+    _candidate_set: set[PartialSolution]
     count: int
 
     def __init__(self) -> None:
         super().__init__()
-        self.candidates_by_uniques_by_last_letter = {}
-        self.candidates_by_last_letter_by_uniques = {}
+        self.candidates_by_mask_by_last_letter = {}
         self.linear_candidates = []
+        self._candidate_set = set()
         self.count = 0
 
     def insert(self, candidate: PartialSolution) -> None:
@@ -90,31 +168,154 @@ class PartialSolutionMap(Mapping):
         Args:
           candidate: The partial solution to add.
         """
-        solutions_by_uniques = self.candidates_by_uniques_by_last_letter.setdefault(
+        solutions_by_mask = self.candidates_by_mask_by_last_letter.setdefault(
             candidate.last_letter, {}
         )
-        solutions_list = solutions_by_uniques.setdefault(
-            len(candidate.unique_letters), []
-        )
-        solutions_list.append(candidate)
-
-        solutions_by_last_letter = self.candidates_by_last_letter_by_uniques.setdefault(
-            len(candidate.unique_letters), {}
-        )
-        solutions_list = solutions_by_last_letter.setdefault(candidate.last_letter, [])
+        solutions_list = solutions_by_mask.setdefault(candidate.mask, [])
         solutions_list.append(candidate)
 
         self.linear_candidates.append(candidate)
+        self._candidate_set.add(candidate)
         self.count += 1
 
-    def merge(self, other: Iterable[PartialSolution]) -> None:
+    def extend_bucket(
+        self,
+        last_letter: Letter,
+        mask: LetterMask,
+        candidates: list[PartialSolution],
+    ) -> None:
+        """
+        Add new partial solutions that share a last letter and mask.
+
+        Args:
+          last_letter: The last letter of every candidate.
+          mask: The letter mask of every candidate.
+          candidates: The partial solutions to add; none may already be present.
+        """
+        self.candidates_by_mask_by_last_letter.setdefault(last_letter, {}).setdefault(
+            mask, []
+        ).extend(candidates)
+        self.linear_candidates.extend(candidates)
+        self._candidate_set.update(candidates)
+        self.count += len(candidates)
+
+    def clear(self) -> None:
+        """Remove all partial solutions, keeping the instance for reuse."""
+        self.candidates_by_mask_by_last_letter.clear()
+        self.linear_candidates.clear()
+        self._candidate_set.clear()
+        self.count = 0
+
+    def merge(
+        self,
+        other: Iterable[PartialSolution],
+        below_unique_count: UniqueCount | None = None,
+    ) -> None:
         """
         Merge a sequence of partial solutions into this instance.
+
+        Args:
+          other: The partial solutions to merge. Another PartialSolutionMap is
+            merged a whole mask bucket at a time.
+          below_unique_count: If given, only partial solutions with fewer unique
+            letters than this are merged.
         """
-        for candidate in other:
-            if candidate in self.linear_candidates:
-                continue
-            self.insert(candidate)
+        if not isinstance(other, PartialSolutionMap):
+            if below_unique_count is not None:
+                other = (
+                    candidate
+                    for candidate in other
+                    if candidate.unique_count < below_unique_count
+                )
+            for candidate in other:
+                if candidate in self._candidate_set:
+                    continue
+                self.insert(candidate)
+            return
+        candidate_set = self._candidate_set
+        other_by_last_letter = other.candidates_by_mask_by_last_letter
+        for letter, other_candidates_by_mask in other_by_last_letter.items():
+            for mask, other_candidates in other_candidates_by_mask.items():
+                if (
+                    below_unique_count is not None
+                    and mask.bit_count() >= below_unique_count
+                ):
+                    continue
+                new_candidates = [
+                    candidate
+                    for candidate in other_candidates
+                    if candidate not in candidate_set
+                ]
+                if new_candidates:
+                    self.extend_bucket(letter, mask, new_candidates)
+
+    def candidates_with_last_letter(self, letter: Letter) -> Iterator[PartialSolution]:
+        """
+        Iterates the partial solutions ending in a letter, without building a
+        list of them.
+
+        Args:
+          letter: The last letter to look up.
+
+        Returns: An iterator over the matching partial solutions.
+        """
+        for candidates in self.candidates_by_mask_by_last_letter.get(
+            letter, {}
+        ).values():
+            yield from candidates
+
+    def candidates_with_unique_count(
+        self, unique_count: UniqueCount
+    ) -> Iterator[PartialSolution]:
+        """
+        Iterates the partial solutions with a number of unique letters, without
+        building a list of them.
+
+        Args:
+          unique_count: The number of unique letters to look up.
+
+        Returns: An iterator over the matching partial solutions.
+        """
+        for letter in self.candidates_by_mask_by_last_letter:
+            yield from self._candidates_with_letter_and_unique_count(
+                letter, unique_count
+            )
+
+    def candidates_below_unique_count(
+        self, unique_count: UniqueCount
+    ) -> Iterator[PartialSolution]:
+        """
+        Iterates the partial solutions with fewer unique letters than a count,
+        checking each mask bucket once rather than each partial solution.
+
+        Args:
+          unique_count: The number of unique letters to stay below.
+
+        Returns: An iterator over the matching partial solutions.
+        """
+        for candidates_by_mask in self.candidates_by_mask_by_last_letter.values():
+            for mask, candidates in candidates_by_mask.items():
+                if mask.bit_count() < unique_count:
+                    yield from candidates
+
+    def _candidates_with_letter_and_unique_count(
+        self, letter: Letter, unique_count: UniqueCount
+    ) -> Iterator[PartialSolution]:
+        """
+        Iterates the partial solutions ending in a letter with a number of
+        unique letters.
+
+        Args:
+          letter: The last letter to look up.
+          unique_count: The number of unique letters to look up.
+
+        Returns: An iterator over the matching partial solutions.
+        """
+        for mask, candidates in self.candidates_by_mask_by_last_letter.get(
+            letter, {}
+        ).items():
+            if mask.bit_count() == unique_count:
+                yield from candidates
 
     def __getitem__(
         self,
@@ -124,37 +325,22 @@ class PartialSolutionMap(Mapping):
         or tuple[UniqueCount, Letter],
     ) -> dict[list[PartialSolution]] or list[PartialSolution]:
         if isinstance(lookup, Letter):
-            candidates_by_uniques = self.candidates_by_uniques_by_last_letter.get(
-                lookup, {}
-            )
-            return [
-                candidate
-                for candidates in candidates_by_uniques.values()
-                for candidate in candidates
-            ]
+            return list(self.candidates_with_last_letter(lookup))
         if isinstance(lookup, UniqueCount):
-            candidates_by_last_letter = self.candidates_by_last_letter_by_uniques.get(
-                lookup, {}
-            )
-            return [
-                candidate
-                for candidates in candidates_by_last_letter.values()
-                for candidate in candidates
-            ]
+            return list(self.candidates_with_unique_count(lookup))
         if isinstance(lookup, tuple):
             if isinstance(lookup[0], Letter) and isinstance(lookup[1], UniqueCount):
-                return self.candidates_by_uniques_by_last_letter.get(lookup[0], {}).get(
-                    lookup[1], []
+                return list(
+                    self._candidates_with_letter_and_unique_count(lookup[0], lookup[1])
                 )
             if isinstance(lookup[0], UniqueCount) and isinstance(lookup[1], Letter):
-                return self.candidates_by_last_letter_by_uniques.get(lookup[0], {}).get(
-                    lookup[1], []
+                return list(
+                    self._candidates_with_letter_and_unique_count(lookup[1], lookup[0])
                 )
         raise LookupError("Provided key type is not valid.")
 
-    def __iter__(self) -> Generator[PartialSolution]:
-        for candidate in self.linear_candidates:
-            yield candidate
+    def __iter__(self) -> Iterator[PartialSolution]:
+        return iter(self.linear_candidates)
 
     def __len__(self) -> int:
         return self.count
@@ -168,14 +354,20 @@ class SolutionList(Mapping):
     Data structure to represent solutions.
     """
 
-    solutions_by_words: OrderedDict[UniqueCount, list[PartialSolution]]
+    # Keys are kept in ascending order.
+    solutions_by_words: dict[WordCount, list[PartialSolution]]
+    _sorted_keys: list[WordCount]
     linear_solutions = list[PartialSolution]
+    # The same solutions as linear_solutions, for constant time membership.
+    _solution_set: set[PartialSolution]
     count: int
 
     def __init__(self) -> None:
         super().__init__()
-        self.solutions_by_words = OrderedDict()
+        self.solutions_by_words = {}
+        self._sorted_keys = []
         self.linear_solutions = []
+        self._solution_set = set()
         self.count = 0
 
     def insert(self, solution: Solution) -> None:
@@ -185,17 +377,78 @@ class SolutionList(Mapping):
         Args:
           solution: A puzzle solution.
         """
-        solutions_list = self.solutions_by_words.setdefault(len(solution), [])
-        if not solutions_list:
-            # maintain ascending key order
-            ascending_keys = sorted(self.solutions_by_words.keys())
-            for key in ascending_keys:
-                self.solutions_by_words.move_to_end(key)
-
+        solutions_list = self._solutions_with_words(len(solution))
         solutions_list.append(solution)
         self.linear_solutions.append(solution)
+        self._solution_set.add(solution)
         self.count += 1
 
+    def extend(self, solutions: Iterable[Solution]) -> list[Solution]:
+        """
+        Add several solutions to the data structure, skipping known ones.
+
+        Args:
+          solutions: Puzzle solutions.
+
+        Returns: The solutions that were added.
+        """
+        solution_set = self._solution_set
+        new_solutions_by_words = {}
+        for solution in solutions:
+            if solution in solution_set:
+                continue
+            solution_set.add(solution)
+            new_solutions_by_words.setdefault(len(solution), []).append(solution)
+        new_solutions = []
+        for key, key_solutions in new_solutions_by_words.items():
+            self._solutions_with_words(key).extend(key_solutions)
+            new_solutions.extend(key_solutions)
+        # Published together, like insert, once they are in linear_solutions.
+        self.linear_solutions.extend(new_solutions)
+        self.count += len(new_solutions)
+        return new_solutions
+
+    def _solutions_with_words(self, key: WordCount) -> list[Solution]:
+        """
+        Get the bucket for a number of words, adding it in order if needed.
+
+        Args:
+          key: The number of words.
+
+        Returns: The solutions with that many words.
+        """
+        solutions_list = self.solutions_by_words.get(key)
+        if solutions_list is None:
+            solutions_list = self.solutions_by_words[key] = []
+            insort(self._sorted_keys, key)
+            if key != self._sorted_keys[-1]:
+                # Solutions are mostly found in ascending length, so the
+                # dictionary only needs reordering when a shorter one shows up.
+                self.solutions_by_words = {
+                    word_count: self.solutions_by_words[word_count]
+                    for word_count in self._sorted_keys
+                }
+        return solutions_list
+
+    def snapshot(self) -> SolutionList:
+        """
+        A copy of the data structure that can be read while this instance
+        keeps growing. Solutions are write-once, so they are shared rather
+        than copied.
+
+        This is safe to call from another thread while a single writer keeps
+        inserting, without a lock. insert publishes a solution by bumping
+        count only after it is in linear_solutions, and the copy is rebuilt
+        from that list alone.
+
+        Returns: The copy.
+        """
+        count = self.count
+        copy = SolutionList()
+        for solution in self.linear_solutions[:count]:
+            copy.insert(solution)
+        return copy
+
     def flatten(self) -> list[Solution]:
         """A one dimensional representation of the data.
 
@@ -213,12 +466,10 @@ class SolutionList(Mapping):
         raise LookupError("Provided key type is not valid.")
 
     def __contains__(self, item: object) -> bool:
-        return item in self.linear_solutions
+        return item in self._solution_set
 
-    def __iter__(self) -> Generator[Solution]:
-        for solution_list in self.solutions_by_words.values():
-            for solution in solution_list:
-                yield solution
+    def __iter__(self) -> Iterator[Solution]:
+        return chain.from_iterable(self.solutions_by_words.values())
 
     def __len__(self) -> int:
         return self.count
@@ -230,32 +481,75 @@ class SolutionList(Mapping):
 class SolutionFinder:
     """
     Runs solution search algorithms in a thread.
+
+    Every search reads max_depth the same way: it is the most words a solution
+    may have, and 0 or None means any number.
     """
 
     game_dictionary: GameDictionary
     max_depth: int
+    beam_width: int
+    merge_equivalent_candidates: bool
     solutions: SolutionList
-    _solutions_lock: Lock
     _solver_thread: Thread
     _thread_should_stop: bool
+    _num_game_letters: int
     # Only accessed in thread
     _solution_candidates: PartialSolutionMap
-
-    def __init__(self, game_dictionary: GameDictionary, max_depth: int = None) -> None:
+    # The partial solutions added by the last breadth first pass, or None to
+    # extend all of _solution_candidates.
+    _frontier: PartialSolutionMap | None
+    # Game words grouped by first letter, built on first use.
+    _words_by_first_letter: dict[Letter, list[Word]] | None
+    _max_word_unique_count: UniqueCount
+
+    def __init__(
+        self,
+        game_dictionary: GameDictionary,
+        max_depth: int = None,
+        beam_width: int = 0,
+        merge_equivalent_candidates: bool = False,
+        shortest_only: bool = False,
+    ) -> None:
         """
         Args:
           game_dictionary: The dictionary of game words.
-          max_depth: The maximum number of words to consider within a word sequence.
+          max_depth: The maximum number of words in a solution. 0 or None for
+            any number.
+          beam_width: If nonzero, breadth first search is used, and each pass
+            only keeps this many new partial solutions per last letter,
+            preferring those with the most unique letters. This bounds the
+            search but may miss solutions.
+          merge_equivalent_candidates: If true, breadth first search is used,
+            and only keeps one partial solution for each last letter and set of
+            unique letters, preferring the fewest words and then the fewest
+            letters, and drops those whose letters are a subset of another's.
+            Every shortest solution length is still found, but not every
+            solution.
+          shortest_only: If true, only the solutions with the fewest words are
+            searched for, keeping just the current word sequence in memory.
+            This takes precedence over beam_width and
+            merge_equivalent_candidates.
         """
         self.game_dictionary = game_dictionary
         self.max_depth = max_depth
+        self.beam_width = beam_width
+        self.merge_equivalent_candidates = merge_equivalent_candidates
         self.solutions = SolutionList()
-        self._solutions_lock = Lock()
-        self._solver_thread = Thread(
-            target=self._find_solutions_depth_first, daemon=True
-        )
+        if shortest_only:
+            search = self._find_solutions_iterative_deepening
+        elif merge_equivalent_candidates or beam_width:
+            # Only breadth first search merges or bounds its partial solutions.
+            search = self._find_solutions_breadth_first
+        else:
+            search = self._find_solutions_depth_first
+        self._solver_thread = Thread(target=search, daemon=True)
         self._thread_should_stop = False
+        self._num_game_letters = len(game_dictionary.get_letter_candidates())
         self._solution_candidates = PartialSolutionMap()
+        self._frontier = None
+        self._words_by_first_letter = None
+        self._max_word_unique_count = 0
 
     def _seed_candidates(self) -> PartialSolutionMap:
         """
@@ -263,11 +557,13 @@ class SolutionFinder:
 
         Returns: A PartialSolutionMap with single-word partial solutions.
         """
-        print("seeding candidates")
+        logger.debug("seeding candidates")
         new_candidates = PartialSolutionMap()
-        for word in self.game_dictionary.ordered_by_first_letter():
-            candidate = PartialSolution(WordSequence(word))
-            new_candidates.insert(candidate)
+        # Merged rather than inserted so a repeated word is seeded once.
+        new_candidates.merge(
+            PartialSolution(WordSequence(word))
+            for word in self.game_dictionary.ordered_by_first_letter()
+        )
         return new_candidates
 
     def start(self) -> None:
@@ -306,9 +602,7 @@ class SolutionFinder:
 
         Returns: All known solutions.
         """
-        with self._solutions_lock:
-            ret_val = deepcopy(self.solutions)
-        return ret_val
+        return self.solutions.snapshot()
 
     def _add_new_solution(self, new_solution: Solution) -> None:
         """
@@ -317,17 +611,29 @@ class SolutionFinder:
         Args:
           new_solution: A new solution
         """
-        with self._solutions_lock:
-            self.solutions.insert(new_solution)
-        print(
-            f"Found new solution: "
-            f"{' - '.join([str(word) for word in new_solution.sequence])}"
+        self.solutions.insert(new_solution)
+        if logger.isEnabledFor(logging.INFO):
+            self._log_new_solution(new_solution)
+
+    @staticmethod
+    def _log_new_solution(new_solution: Solution) -> None:
+        """
+        Log a new solution.
+
+        Args:
+          new_solution: A new solution
+        """
+        logger.info(
+            "Found new solution: %s",
+            " - ".join(map(str, new_solution.sequence)),
         )
 
     @staticmethod
     def _add_word_to_solution_candidates(
         solution_candidates: PartialSolutionMap,
         new_word: Word,
+        min_unique_count: UniqueCount = 0,
+        new_solution_candidates: PartialSolutionMap = None,
     ) -> PartialSolutionMap:
         """
         Adds a given word to appropriate partial solutions.
@@ -335,16 +641,57 @@ class SolutionFinder:
         Args:
           solution_candidates: A group of partial solutions.
           new_word: The word to add to the solution candidates.
+          min_unique_count: Partial solutions that would have fewer unique
+            letters than this after adding the word are skipped.
+          new_solution_candidates: The map to add the new partial solutions
+            to. A new map is used if not given.
 
         Returns: The partial solutions that include the new word.
         """
-        new_solution_candidates = PartialSolutionMap()
-        candidates = solution_candidates[new_word.first_letter]
-        for solution_candidate in candidates:
-            if new_word in solution_candidate.sequence:
+        if new_solution_candidates is None:
+            new_solution_candidates = PartialSolutionMap()
+        candidates_by_mask = solution_candidates.candidates_by_mask_by_last_letter.get(
+            new_word.first_letter, {}
+        )
+        new_word_mask = new_word.mask
+        # A word that ends on the letter it starts with and adds no letters
+        # leaves a candidate as it was, only a word longer.
+        loops_back = new_word.first_letter == new_word.last_letter
+        new_last_letter = new_word.last_letter
+        new_partial_solution = PartialSolution.__new__
+        extend_bucket = new_solution_candidates.extend_bucket
+        for candidate_mask, candidates in candidates_by_mask.items():
+            # Candidates sharing a mask share the outcome of both mask checks,
+            # so they are made once per bucket.
+            new_mask = candidate_mask | new_word_mask
+            new_unique_count = new_mask.bit_count()
+            if new_unique_count < min_unique_count:
                 continue
-            new_candidate = solution_candidate.clone_and_extend(new_word)
-            new_solution_candidates.insert(new_candidate)
+            # A word with a letter the candidate lacks cannot already be in
+            # it, which saves scanning the sequence for most words.
+            check_sequence = new_mask == candidate_mask
+            if check_sequence and loops_back:
+                continue
+            new_candidates = []
+            for solution_candidate in candidates:
+                if check_sequence and solution_candidate.contains_word(new_word):
+                    continue
+                # clone_and_extend inlined: the bucket already guarantees the
+                # letters join up, and the whole bucket shares the new mask.
+                new_candidate = new_partial_solution(PartialSolution)
+                new_candidate._sequence = None
+                new_candidate._parent = solution_candidate
+                new_candidate._word = new_word
+                new_candidate.depth = solution_candidate.depth + 1
+                new_candidate.last_letter = new_last_letter
+                new_candidate.mask = new_mask
+                new_candidate.unique_count = new_unique_count
+                new_candidate._hash = hash((solution_candidate._hash, new_word))
+                new_candidates.append(new_candidate)
+            # The children of one bucket share a last letter and mask, so they
+            # are indexed together rather than inserted one at a time.
+            if new_candidates:
+                extend_bucket(new_last_letter, new_mask, new_candidates)
         return new_solution_candidates
 
     def _promote_candidates(self, candidates: PartialSolutionMap) -> list[Solution]:
@@ -356,62 +703,277 @@ class SolutionFinder:
 
         Returns: Newly found solutions.
         """
-        new_solutions = []
-        num_game_letters = len(self.game_dictionary.get_letter_candidates())
-        for new_candidate in candidates:
-            if len(new_candidate.unique_letters) != num_game_letters:
-                continue
-            if new_candidate in self.solutions:
-                continue
-            new_solutions.append(new_candidate)
-            self._add_new_solution(new_solutions[-1])
+        # Words only use game letters, so the count alone identifies a
+        # candidate that uses all of them, and the index hands over exactly
+        # those without looking at the rest. They are added in one batch, as
+        # a pass can find millions.
+        new_solutions = self.solutions.extend(
+            candidates.candidates_with_unique_count(self._num_game_letters)
+        )
+        if logger.isEnabledFor(logging.INFO):
+            for new_solution in new_solutions:
+                self._log_new_solution(new_solution)
         return new_solutions
 
-    def _mutate_solution_candidates(self) -> int:
+    def _get_words_by_first_letter(self) -> dict[Letter, list[Word]]:
+        """
+        Groups the game words by first letter once, so each breadth first pass
+        can reuse the groups.
+
+        Returns: The game words keyed by first letter.
+        """
+        if self._words_by_first_letter is None:
+            words = self.game_dictionary.ordered_by_first_letter()
+            words_by_first_letter = {}
+            # A word listed twice in the word file would otherwise make the same
+            # child twice.
+            for word in dict.fromkeys(words):
+                words_by_first_letter.setdefault(word.first_letter, []).append(word)
+            self._words_by_first_letter = words_by_first_letter
+            self._max_word_unique_count = max(
+                (word.unique_count for word in words), default=0
+            )
+        return self._words_by_first_letter
+
+    def _mutate_solution_candidates(self, remaining_depth: int = None) -> int:
         """
         Iterates current candidates in a breadth first manner. by testing each
-        candidate against all words in the game dictionary.
+        candidate against all words in the game dictionary. Only the candidates
+        added by the last pass are extended, since older ones were already
+        extended by an earlier pass.
+
+        Args:
+          remaining_depth: How many more words may be added after this pass.
+            New candidates that could not use every game letter even if each
+            of those words added as many letters as the best word are dropped.
 
         Returns: Count of newly found solutions.
         """
         new_candidates = PartialSolutionMap()
-        start_time = time.time()
-        for i, word in enumerate(self.game_dictionary.ordered_by_first_letter()):
-            child_candidates = self._add_word_to_solution_candidates(
-                self._solution_candidates, word
+        words_by_first_letter = self._get_words_by_first_letter()
+        min_unique_count = 0
+        if remaining_depth is not None:
+            min_unique_count = (
+                self._num_game_letters - remaining_depth * self._max_word_unique_count
             )
-            new_candidates.merge(child_candidates)
-            if i % 20 == 0:
-                print(f"mutated 20 words in {time.time() - start_time} s")
+        solution_candidates = self._frontier
+        if solution_candidates is None:
+            solution_candidates = self._solution_candidates
+        add_word_to_solution_candidates = self._add_word_to_solution_candidates
+        log_progress = logger.isEnabledFor(logging.DEBUG)
+        start_time = time.time() if log_progress else 0.0
+        # Children of distinct candidates are distinct, so every word adds
+        # straight into one map rather than merging a map per word.
+        for letter in solution_candidates.candidates_by_mask_by_last_letter:
+            for word in words_by_first_letter.get(letter, ()):
+                add_word_to_solution_candidates(
+                    solution_candidates, word, min_unique_count, new_candidates
+                )
+            if log_progress:
+                logger.debug(
+                    "mutated words starting with %s in %s s",
+                    letter,
+                    time.time() - start_time,
+                )
                 start_time = time.time()
         new_solutions = self._promote_candidates(new_candidates)
-        partial_solutions = filter(
-            lambda candidate: candidate not in new_solutions, new_candidates
+        # Candidates using every letter are solutions, new or already known,
+        # and are never extended.
+        frontier = PartialSolutionMap()
+        if not self.merge_equivalent_candidates and not self.beam_width:
+            frontier.merge(new_candidates, self._num_game_letters)
+            self._solution_candidates.merge(frontier)
+            self._frontier = frontier
+            return len(new_solutions)
+        partial_solutions = new_candidates.candidates_below_unique_count(
+            self._num_game_letters
         )
-        self._solution_candidates.merge(partial_solutions)
+        if self.merge_equivalent_candidates:
+            partial_solutions = self._dominant_candidates(
+                partial_solutions, self._solution_candidates
+            )
+        if self.beam_width:
+            partial_solutions = self._best_candidates(
+                partial_solutions, self.beam_width
+            )
+        frontier.merge(partial_solutions)
+        self._solution_candidates.merge(frontier)
+        self._frontier = frontier
         return len(new_solutions)
 
+    @staticmethod
+    def _best_candidates(
+        candidates: Iterable[PartialSolution], beam_width: int
+    ) -> list[PartialSolution]:
+        """
+        Keeps the partial solutions with the most unique letters for each last
+        letter.
+
+        Args:
+          candidates: The partial solutions to choose from.
+          beam_width: How many partial solutions to keep per last letter.
+
+        Returns: The kept partial solutions.
+        """
+        candidates_by_last_letter = {}
+        for candidate in candidates:
+            candidates_by_last_letter.setdefault(candidate.last_letter, []).append(
+                candidate
+            )
+        best = []
+        for letter_candidates in candidates_by_last_letter.values():
+            best.extend(
+                nlargest(
+                    beam_width,
+                    letter_candidates,
+                    key=lambda candidate: candidate.unique_count,
+                )
+            )
+        return best
+
+    @staticmethod
+    def _dominant_candidates(
+        candidates: Iterable[PartialSolution],
+        existing_candidates: PartialSolutionMap,
+    ) -> list[PartialSolution]:
+        """
+        Keeps one partial solution for each last letter and letter mask, since
+        any words that complete one of them complete all of them. Partial
+        solutions whose letters are a strict subset of another's with the same
+        last letter are dropped too, since the same words complete that one in
+        as few words.
+
+        Args:
+          candidates: The new partial solutions to choose from. They must all
+            have the same number of words.
+          existing_candidates: Partial solutions with fewer words. New partial
+            solutions equivalent to or dominated by one of these are dropped.
+
+        Returns: The kept partial solutions, with the fewest letters for each
+          last letter and letter mask.
+        """
+        existing_masks_by_last_letter = (
+            existing_candidates.candidates_by_mask_by_last_letter
+        )
+        best = {}
+        for candidate in candidates:
+            if candidate.mask in existing_masks_by_last_letter.get(
+                candidate.last_letter, {}
+            ):
+                continue
+            key = (candidate.last_letter, candidate.mask)
+            letter_count = sum(len(word) for word in candidate.sequence)
+            kept = best.get(key)
+            if kept is None or letter_count < kept[0]:
+                best[key] = (letter_count, candidate)
+        new_masks_by_last_letter = {}
+        for last_letter, mask in best:
+            new_masks_by_last_letter.setdefault(last_letter, []).append(mask)
+        dominant = []
+        for (last_letter, mask), (_, candidate) in best.items():
+            for other_masks in (
+                existing_masks_by_last_letter.get(last_letter, ()),
+                new_masks_by_last_letter[last_letter],
+            ):
+                if any(
+                    other_mask & mask == mask and other_mask != mask
+                    for other_mask in other_masks
+                ):
+                    break
+            else:
+                dominant.append(candidate)
+        return dominant
+
     def _find_solutions_breadth_first(self) -> None:
         """
         Iterate through all words, finding all other words that can follow
         after it and identifying any sequences that meet solution criteria.
         """
-        self._solution_candidates = self._seed_candidates()
+        seed_candidates = self._seed_candidates()
+        # A word may use every letter on its own.
+        self._promote_candidates(seed_candidates)
+        self._solution_candidates = PartialSolutionMap()
+        self._solution_candidates.merge(seed_candidates, self._num_game_letters)
+        self._frontier = None
         have_solutions = False
-        depth = 0
+        # The number of words in the newest partial solutions.
+        depth = 1
         while not self._thread_should_stop:
+            if self.max_depth and depth >= self.max_depth:
+                logger.info("stopping search because max depth has been reached.")
+                break
             depth += 1
-            new_solutions_count = self._mutate_solution_candidates()
+            new_solutions_count = self._mutate_solution_candidates(
+                self.max_depth - depth if self.max_depth else None
+            )
             if new_solutions_count:
                 have_solutions = True
             if have_solutions and new_solutions_count == 0:
                 # If adding more words didn't help we can stop looking
-                print("stopping search because no more solutions were found.")
+                logger.info("stopping search because no more solutions were found.")
                 break
-            if self.max_depth and depth >= self.max_depth:
-                print("stopping search because max depth has been reached.")
+            if self._frontier is not None and not self._frontier:
+                logger.info("stopping search because no partial solutions are left.")
+                break
+        logger.info("Search has ended.")
+
+    def _find_solutions_iterative_deepening(self) -> None:
+        """
+        Finds the solutions with the fewest words. Depth first searches are run
+        with a growing word limit until one finds solutions, so only the current
+        word sequence is kept rather than every partial solution.
+        """
+        words_by_first_letter = self._get_words_by_first_letter()
+        words = [word for words in words_by_first_letter.values() for word in words]
+        max_depth = self.max_depth or self._num_game_letters
+        for depth_limit in range(1, max_depth + 1):
+            logger.debug("searching sequences of up to %d words", depth_limit)
+            for word in words:
+                if self._thread_should_stop:
+                    logger.info("Search has ended.")
+                    return
+                self._extend_depth_first(
+                    PartialSolution(WordSequence(word)), depth_limit
+                )
+            if self.solutions_count():
+                logger.info(
+                    "stopping search because the shortest solutions were found."
+                )
                 break
-        print("Search has ended.")
+        logger.info("Search has ended.")
+
+    def _extend_depth_first(
+        self, candidate: PartialSolution, depth_limit: WordCount
+    ) -> None:
+        """
+        Adds every solution that starts with a partial solution and has no more
+        than a number of words.
+
+        Args:
+          candidate: The partial solution to extend.
+          depth_limit: The most words a solution may have.
+        """
+        if candidate.unique_count == self._num_game_letters:
+            self._add_new_solution(candidate)
+            return
+        remaining_depth = depth_limit - candidate.depth
+        if remaining_depth <= 0:
+            return
+        # Same bound as breadth first search: after this word, the rest must
+        # be able to add the missing letters.
+        min_unique_count = (
+            self._num_game_letters - (remaining_depth - 1) * self._max_word_unique_count
+        )
+        candidate_mask = candidate.mask
+        for word in self._words_by_first_letter.get(candidate.last_letter, ()):
+            new_mask = candidate_mask | word.mask
+            if new_mask.bit_count() < min_unique_count:
+                continue
+            if new_mask == candidate_mask and (
+                word.first_letter == word.last_letter or candidate.contains_word(word)
+            ):
+                continue
+            self._extend_depth_first(candidate.clone_and_extend(word), depth_limit)
 
     def _find_solutions_depth_first(self) -> None:
         """
@@ -420,40 +982,55 @@ class SolutionFinder:
         words.
         """
         self._solution_candidates = PartialSolutionMap()
-        num_game_letters = len(self.game_dictionary.get_letter_candidates())
+        num_game_letters = self._num_game_letters
+        max_depth = self.max_depth
         one_word_solutions = PartialSolutionMap()
+        # Reused for every word rather than allocating a map per word.
+        child_candidates = PartialSolutionMap()
         for word in self.game_dictionary.get_words_with_uniques(num_game_letters):
             one_word_solutions.insert(PartialSolution(WordSequence(word)))
             self._promote_candidates(one_word_solutions)
+        if max_depth == 1:
+            return
 
         for loop in range(0, num_game_letters):
-            print(f"running meta pass {loop}")
+            logger.debug("running meta pass %d", loop)
             for number in reversed(range(1, num_game_letters)):
-                print(f"processing words with {number} unique letters")
+                logger.debug("processing words with %d unique letters", number)
                 for word in self.game_dictionary.get_words_with_uniques(number):
                     candidate = PartialSolution(WordSequence(word))
                     self._solution_candidates.insert(candidate)
-                print(
-                    f"Generated {len(self._solution_candidates)} "
-                    "candidates with root words."
+                logger.debug(
+                    "Generated %d candidates with root words.",
+                    len(self._solution_candidates),
                 )
                 last_candidates_len = len(self._solution_candidates)
                 last_solutions_count = self.solutions_count()
                 for word in self.game_dictionary.get_words_with_uniques(number):
-                    child_candidates = self._add_word_to_solution_candidates(
-                        self._solution_candidates, word
+                    child_candidates.clear()
+                    self._add_word_to_solution_candidates(
+                        self._solution_candidates, word, 0, child_candidates
                     )
-                    new_solutions = self._promote_candidates(child_candidates)
-                    partial_solutions = filter(
-                        lambda candidate: candidate not in new_solutions,
-                        child_candidates,
+                    self._promote_candidates(child_candidates)
+                    if not max_depth:
+                        self._solution_candidates.merge(
+                            child_candidates, num_game_letters
+                        )
+                        continue
+                    # Only partial solutions that can take another word are kept.
+                    self._solution_candidates.merge(
+                        (
+                            candidate
+                            for candidate in child_candidates
+                            if candidate.depth < max_depth
+                        ),
+                        num_game_letters,
                     )
-                    self._solution_candidates.merge(partial_solutions)
-                print(
-                    f"Created {len(self._solution_candidates) - last_candidates_len} "
-                    "two word candidates"
+                logger.debug(
+                    "Created %d two word candidates",
+                    len(self._solution_candidates) - last_candidates_len,
                 )
-                print(
-                    f"Found {self.solutions_count() - last_solutions_count} new "
-                    "solutions"
+                logger.debug(
+                    "Found %d new solutions",
+                    self.solutions_count() - last_solutions_count,
                 )
@@ -2,3 +2,4 @@
 Letter = str
 UniqueCount = int
 WordCount = int
+LetterMask = int
@@ -1,7 +1,33 @@
 from copy import deepcopy
+import json
+import os
+from threading import Thread
 import pytest
 
-from lbsolve.game_dictionary import GameDictionary, Word, WordSequence
+from lbsolve.game_dictionary import (
+    GameDictionary,
+    Word,
+    WordSequence,
+    letter_mask,
+    mask_letters,
+)
+
+
+class TestLetterMask:
+    def test_letter_mask(self):
+        assert letter_mask("") == 0
+        assert letter_mask("a") == 0b1
+        assert letter_mask("abc") == 0b111
+        assert letter_mask("zz") == 1 << 25
+
+    def test_mask_letters(self):
+        assert mask_letters(0) == frozenset()
+        assert mask_letters(0b101) == {"a", "c"}
+        assert mask_letters(1 << 25) == {"z"}
+
+    def test_round_trip(self):
+        letters = {"l", "e", "t", "r", "s"}
+        assert mask_letters(letter_mask(letters)) == letters
 
 
 class TestWord:
@@ -10,13 +36,30 @@ class TestWord:
         assert word._word == "booboo"
         assert word.first_letter == "b"
         assert word.last_letter == "o"
+        assert word.mask == letter_mask("bo")
+        assert word.unique_count == 2
         assert word.unique_letters == {"b", "o"}
 
+    def test_slots(self):
+        word = Word("slim")
+        assert not hasattr(word, "__dict__")
+        with pytest.raises(AttributeError):
+            word.extra = True
+
     def test_wrong_type_init(self):
         with pytest.raises(TypeError) as ctx:
             Word(["w", "r", "o", "n", "g"])
         assert "'word' should be type 'str', not 'list'." == str(ctx.value)
 
+    @pytest.mark.parametrize("raw_word", ["Hello", "don't", "café"])
+    def test_letters_outside_alphabet(self, raw_word):
+        with pytest.raises(ValueError) as ctx:
+            Word(raw_word)
+        assert (
+            f"'word' should only contain the letters a to z, not '{raw_word}'."
+            == str(ctx.value)
+        )
+
     def test_to_str(self):
         raw_word = "pleasant"
         word = Word(raw_word)
@@ -27,11 +70,21 @@ class TestWord:
         word = Word(raw_word)
         assert repr(word) == f"Word({raw_word})"
 
+    def test_len(self):
+        assert len(Word("length")) == 6
+
     def test_eq(self):
         word = Word("soliloquy")
         word_copy = deepcopy(word)
         assert word == word_copy
 
+    def test_interned(self):
+        word = Word("soliloquy")
+        assert Word("soliloquy") is word
+        assert deepcopy(word) is word
+        assert Word("soliloquies") is not word
+        assert Word("soliloquies") != word
+
     def test_factory(self):
         rocket, ship = Word.factory("rocket", "ship")
         assert isinstance(rocket, Word)
@@ -53,6 +106,10 @@ class TestWordSequence:
             ctx.value
         )
 
+    def test_slots(self):
+        word_sequence = WordSequence(*Word.factory("thin", "news"))
+        assert not hasattr(word_sequence, "__dict__")
+
     def test_init(self):
         words = Word.factory("big", "dirty", "stinking", "bass")
         word_sequence = WordSequence(*words)
@@ -76,17 +133,24 @@ class TestWordSequence:
         for index, word in enumerate(word_sequence):
             assert word == words[index]
 
+    def test_iter_protocol(self):
+        words = Word.factory("one", "pass", "only")
+        word_sequence = WordSequence(*words)
+        assert list(iter(word_sequence)) == list(word_sequence) == words
+
     def test_in(self):
         words = Word.factory("no", "sleep", "remix")
         word_sequence = WordSequence(*words)
         for word in words:
             assert word in word_sequence
+        assert Word("remixes") not in word_sequence
 
     def test_equal(self):
         sequence = (Word("cat"), Word("tap"), Word("pat"))
         word_sequence = WordSequence(*sequence)
         word_sequence_copy = deepcopy(word_sequence)
         assert word_sequence == word_sequence_copy
+        assert hash(word_sequence) == hash(word_sequence_copy)
 
     def test_to_str(self):
         words = ["realistic", "canopy", "yank"]
@@ -95,25 +159,64 @@ class TestWordSequence:
         str(word_sequence) == "-".join(words)
 
 
+@pytest.fixture
+def game_dictionary(tmp_path):
+    letter_groups = (
+        ("a", "b", "c"),
+        ("d", "e", "f"),
+        ("g", "h", "i"),
+        ("j", "k", "l"),
+    )
+    tmp_file = tmp_path / "test_dic.txt"
+    tmp_file.write_text("lead\nhead\nbeg\nbead\nkale\nleg\nhide\n")
+    gd = GameDictionary(tmp_file, letter_groups)
+    gd.create()
+    return gd
+
+
 class TestGameDictionary:
     def test_normalize_letter_groups(self):
         letter_groups = (("A", "B", "C"), ("D", "E", "F"))
         normalized = GameDictionary._normalize_letter_groups(letter_groups)
         assert normalized == (("a", "b", "c"), ("d", "e", "f"))
 
+    @pytest.mark.parametrize("letter", ["'", "1", "é"])
+    def test_letter_groups_outside_alphabet(self, letter):
+        letter_groups = (("a", "b", letter), ("d", "e", "f"))
+        with pytest.raises(ValueError, match="a to z"):
+            GameDictionary("", letter_groups)
+
+    def test_letter_groups_masks(self):
+        letter_groups = (("A", "B", "C"), ("d", "e", "f"))
+        gd = GameDictionary("", letter_groups)
+        assert gd.letter_groups_masks == (0b111, 0b111000)
+
+    def test_allowed_next(self):
+        letter_groups = (("a", "b", "c"), ("d", "e", "f"), ("g", "h", "i"))
+        gd = GameDictionary("", letter_groups)
+        assert gd.allowed_next[0] == letter_mask("defghi")
+        assert gd.allowed_next[ord("e") - ord("a")] == letter_mask("abcghi")
+        assert gd.allowed_next[ord("z") - ord("a")] == 0
+
     def test_get_letter_candidates_all(self):
         letter_groups = (("a", "b", "c"), ("d", "e", "f"))
         gd = GameDictionary("", letter_groups)
         candidates = gd.get_letter_candidates()
-        assert candidates == ["a", "b", "c", "d", "e", "f"]
+        assert candidates == {"a", "b", "c", "d", "e", "f"}
 
     def test_get_letter_candidates_other_sides(self):
         letter_groups = (("a", "b", "c"), ("d", "e", "f"), ("g", "h", "i"))
         gd = GameDictionary("", letter_groups)
         candidates = gd.get_letter_candidates("g")
-        assert candidates == ["a", "b", "c", "d", "e", "f"]
+        assert candidates == {"a", "b", "c", "d", "e", "f"}
         candidates = gd.get_letter_candidates("a")
-        assert candidates == ["d", "e", "f", "g", "h", "i"]
+        assert candidates == {"d", "e", "f", "g", "h", "i"}
+
+    def test_get_letter_candidates_not_in_game(self):
+        letter_groups = (("a", "b", "c"), ("d", "e", "f"))
+        gd = GameDictionary("", letter_groups)
+        candidates = gd.get_letter_candidates("z")
+        assert candidates == {"a", "b", "c", "d", "e", "f"}
 
     def test_word_is_valid_invalid_letters(self):
         letter_groups = (
@@ -128,6 +231,10 @@ class TestGameDictionary:
         assert gd.word_is_valid("pat") is False
         assert gd.word_is_valid("sat") is False
         assert gd.word_is_valid("rat") is False
+        assert gd.word_is_valid("b'ad") is False
+        assert gd.word_is_valid("Bad") is False
+        assert gd.word_is_valid("bé") is False
+        assert gd.word_is_valid("beé") is False
 
     def test_word_is_valid_collocated_letters(self):
         letter_groups = (
@@ -153,8 +260,17 @@ class TestGameDictionary:
         assert gd.word_is_valid("head") is True
         assert gd.word_is_valid("lead") is True
 
-    def test__add_word_to_words_by_first_letter(self):
-        pass
+    def test__index_word(self):
+        gd = GameDictionary("", ())
+        lead, lag, bead = Word.factory("lead", "lag", "bead")
+        gd._index_word(lead)
+        gd._index_word(lag)
+        gd._index_word(bead)
+        first_letter_index = ord("l") - ord("a")
+        assert gd._words_by_first_letter[first_letter_index][4] == [lead]
+        assert gd._words_by_first_letter[first_letter_index][3] == [lag]
+        assert gd._words_by_uniques[4][ord("l") - ord("a")] == [lead]
+        assert gd._words_by_uniques[4][ord("b") - ord("a")] == [bead]
 
     def test_create_from_file_all_good(self, monkeypatch, tmp_path):
         tmp_file = tmp_path / "test_dic.txt"
@@ -163,23 +279,11 @@ class TestGameDictionary:
         def mock_word_is_valid(_mSelf, _word):
             return True
 
-        def mock___add_word_to_words_by_first_letter(_mSelf, _word):
-            pass
-
-        def mock__add_word_to_words_by_uniques(_mSelf, _word):
+        def mock__index_word(_mSelf, _word):
             pass
 
         monkeypatch.setattr(GameDictionary, "word_is_valid", mock_word_is_valid)
-        monkeypatch.setattr(
-            GameDictionary,
-            "_add_word_to_words_by_first_letter",
-            mock___add_word_to_words_by_first_letter,
-        )
-        monkeypatch.setattr(
-            GameDictionary,
-            "_add_word_to_words_by_uniques",
-            mock__add_word_to_words_by_uniques,
-        )
+        monkeypatch.setattr(GameDictionary, "_index_word", mock__index_word)
 
         gd = GameDictionary(tmp_file, "")
         gd.create()
@@ -192,23 +296,11 @@ class TestGameDictionary:
         def mock_word_is_valid(_mSelf, _word):
             return True
 
-        def mock___add_word_to_words_by_first_letter(mSelf, word):
-            pass
-
-        def mock__add_word_to_words_by_uniques(mSelf, word):
+        def mock__index_word(mSelf, word):
             pass
 
         monkeypatch.setattr(GameDictionary, "word_is_valid", mock_word_is_valid)
-        monkeypatch.setattr(
-            GameDictionary,
-            "_add_word_to_words_by_first_letter",
-            mock___add_word_to_words_by_first_letter,
-        )
-        monkeypatch.setattr(
-            GameDictionary,
-            "_add_word_to_words_by_uniques",
-            mock__add_word_to_words_by_uniques,
-        )
+        monkeypatch.setattr(GameDictionary, "_index_word", mock__index_word)
 
         gd = GameDictionary(tmp_file, "")
         gd.create()
@@ -227,5 +319,238 @@ class TestGameDictionary:
         gd.create()
         assert gd.invalid_words == 4
 
-    def test_ordered_by_uniques(self):
-        pass
+    def test_create_from_file_short_lines(self, monkeypatch, tmp_path):
+        tmp_file = tmp_path / "test_dic.txt"
+        tmp_file.write_text("a\nab\n\nabc\n")
+        checked = []
+
+        def mock_word_is_valid(_mSelf, word):
+            checked.append(word)
+            return False
+
+        monkeypatch.setattr(GameDictionary, "word_is_valid", mock_word_is_valid)
+
+        gd = GameDictionary(tmp_file, "")
+        gd.create()
+        assert gd.invalid_words == 4
+        assert checked == ["abc"]
+
+    def test_create_from_file_lowercase(self, tmp_path):
+        letter_groups = (
+            ("a", "b", "c"),
+            ("d", "e", "f"),
+            ("g", "h", "i"),
+            ("j", "k", "l"),
+        )
+        tmp_file = tmp_path / "test_dic.txt"
+        tmp_file.write_text("HEAD\nLead\nbad1\n")
+        gd = GameDictionary(tmp_file, letter_groups)
+        gd.create()
+        assert gd.valid_words == 2
+        assert gd.invalid_words == 1
+        assert [str(word) for word in gd.ordered_by_first_letter()] == [
+            "head",
+            "lead",
+        ]
+        # An already lowercase file skips lowercasing but reads the same.
+        tmp_file.write_text("head\nlead\nbad1\n")
+        gd = GameDictionary(tmp_file, letter_groups)
+        gd.create()
+        assert gd.valid_words == 2
+        assert gd.invalid_words == 1
+        assert [str(word) for word in gd.ordered_by_first_letter()] == [
+            "head",
+            "lead",
+        ]
+
+    @pytest.mark.skipif(not hasattr(os, "mkfifo"), reason="needs named pipes")
+    def test_create_from_pipe(self, tmp_path):
+        letter_groups = (
+            ("a", "b", "c"),
+            ("d", "e", "f"),
+            ("g", "h", "i"),
+            ("j", "k", "l"),
+        )
+        pipe = tmp_path / "test_dic.fifo"
+        os.mkfifo(pipe)
+        writer = Thread(target=pipe.write_text, args=("head\nlead\nbeg\nno\n",))
+        writer.start()
+        gd = GameDictionary(pipe, letter_groups)
+        gd.create()
+        writer.join()
+        assert gd.valid_words == 3
+        assert gd.invalid_words == 1
+
+    def test_create_from_file_empty(self, tmp_path):
+        tmp_file = tmp_path / "test_dic.txt"
+        tmp_file.write_text("")
+        gd = GameDictionary(tmp_file, "")
+        gd.create()
+        assert gd.valid_words == 0
+        assert gd.invalid_words == 0
+
+    def test_create_from_file_non_ascii(self, tmp_path):
+        letter_groups = (
+            ("a", "b", "c"),
+            ("d", "e", "f"),
+            ("g", "h", "i"),
+            ("j", "k", "l"),
+        )
+        tmp_file = tmp_path / "test_dic.txt"
+        tmp_file.write_text("Head\nbéd\nlead\n", encoding="utf-8")
+        gd = GameDictionary(tmp_file, letter_groups)
+        gd.create()
+        assert gd.valid_words == 2
+        assert gd.invalid_words == 1
+        assert [str(word) for word in gd.get_words_with_first_letter("h")] == ["head"]
+
+    def test_create_merges_equivalent_words(self, tmp_path):
+        letter_groups = (
+            ("a", "b", "c"),
+            ("d", "e", "f"),
+            ("g", "h", "i"),
+            ("j", "k", "l"),
+        )
+        tmp_file = tmp_path / "test_dic.txt"
+        tmp_file.write_text("kalale\nkale\nkalele\nlead\n")
+        gd = GameDictionary(tmp_file, letter_groups)
+        gd.create()
+        assert gd.valid_words == 4
+        assert gd.equivalent_words == 2
+        assert [str(word) for word in gd.ordered_by_first_letter()] == [
+            "kale",
+            "lead",
+        ]
+
+    def test_create_keeps_equivalent_words(self, tmp_path):
+        letter_groups = (
+            ("a", "b", "c"),
+            ("d", "e", "f"),
+            ("g", "h", "i"),
+            ("j", "k", "l"),
+        )
+        tmp_file = tmp_path / "test_dic.txt"
+        tmp_file.write_text("kalale\nkale\nkalele\nlead\n")
+        gd = GameDictionary(tmp_file, letter_groups, merge_equivalent_words=False)
+        gd.create()
+        assert gd.valid_words == 4
+        assert gd.equivalent_words == 0
+        assert [str(word) for word in gd.ordered_by_first_letter()] == [
+            "kalale",
+            "kale",
+            "kalele",
+            "lead",
+        ]
+
+    def test_create_with_cache(self, monkeypatch, tmp_path):
+        letter_groups = (
+            ("a", "b", "c"),
+            ("d", "e", "f"),
+            ("g", "h", "i"),
+            ("j", "k", "l"),
+        )
+        tmp_file = tmp_path / "test_dic.txt"
+        tmp_file.write_text("kalale\nkale\nlead\nno\nzoo\n")
+        cache_dir = tmp_path / "cache"
+        gd = GameDictionary(tmp_file, letter_groups)
+        gd.create(cache_dir)
+        assert gd.cache_path(cache_dir).is_file()
+
+        def mock__read_word_lines(_mSelf):
+            raise AssertionError("word file read despite cache")
+
+        monkeypatch.setattr(GameDictionary, "_read_word_lines", mock__read_word_lines)
+        cached = GameDictionary(tmp_file, letter_groups)
+        cached.create(cache_dir)
+        assert cached.valid_words == 3
+        assert cached.invalid_words == 2
+        assert cached.equivalent_words == 1
+        assert cached.ordered_by_first_letter() == gd.ordered_by_first_letter()
+
+    def test_cache_path(self, tmp_path):
+        letter_groups = (
+            ("a", "b", "c"),
+            ("d", "e", "f"),
+            ("g", "h", "i"),
+            ("j", "k", "l"),
+        )
+        tmp_file = tmp_path / "test_dic.txt"
+        tmp_file.write_text("lead\n")
+        gd = GameDictionary(tmp_file, letter_groups)
+        path = gd.cache_path(tmp_path)
+        assert path.parent == tmp_path
+        kept = GameDictionary(tmp_file, letter_groups, merge_equivalent_words=False)
+        assert kept.cache_path(tmp_path) != path
+        tmp_file.write_text("lead\nkale\n")
+        assert gd.cache_path(tmp_path) != path
+
+    def test_create_with_corrupt_cache(self, game_dictionary, tmp_path):
+        cache_dir = tmp_path / "cache"
+        cache_dir.mkdir()
+        cache_file = game_dictionary.cache_path(cache_dir)
+        cache_file.write_text("{not json")
+        gd = GameDictionary(
+            game_dictionary.word_list_file, game_dictionary.letter_groups
+        )
+        gd.create(cache_dir)
+        assert gd.ordered_by_uniques() == game_dictionary.ordered_by_uniques()
+        assert '"version": 1' in cache_file.read_text()
+
+    @pytest.mark.parametrize(
+        "cached",
+        [
+            {"version": 1, "words": ["lead"]},
+            {
+                "version": 1,
+                "valid_words": 1,
+                "invalid_words": 0,
+                "equivalent_words": 0,
+                "words": [""],
+            },
+        ],
+        ids=["missing_key", "empty_word"],
+    )
+    def test_create_with_invalid_cache(self, game_dictionary, tmp_path, cached):
+        cache_dir = tmp_path / "cache"
+        cache_dir.mkdir()
+        cache_file = game_dictionary.cache_path(cache_dir)
+        cache_file.write_text(json.dumps(cached))
+        gd = GameDictionary(
+            game_dictionary.word_list_file, game_dictionary.letter_groups
+        )
+        gd.create(cache_dir)
+        assert gd.valid_words == game_dictionary.valid_words
+        assert gd.invalid_words == game_dictionary.invalid_words
+        assert gd.ordered_by_uniques() == game_dictionary.ordered_by_uniques()
+        assert json.loads(cache_file.read_text())["words"] != cached["words"]
+
+    def test_ordered_by_uniques(self, game_dictionary):
+        words = [str(word) for word in game_dictionary.ordered_by_uniques()]
+        assert words == ["beg", "leg", "bead", "head", "kale", "lead"]
+
+    def test_ordered_by_first_letter(self, game_dictionary):
+        words = [str(word) for word in game_dictionary.ordered_by_first_letter()]
+        assert words == ["beg", "bead", "head", "kale", "leg", "lead"]
+
+    def test_ordered_memoized(self, game_dictionary):
+        by_uniques = game_dictionary.ordered_by_uniques()
+        by_first_letter = game_dictionary.ordered_by_first_letter()
+        assert game_dictionary.ordered_by_uniques() is by_uniques
+        assert game_dictionary.ordered_by_first_letter() is by_first_letter
+        game_dictionary._index_word(Word("ache"))
+        assert game_dictionary.ordered_by_uniques() is not by_uniques
+        assert game_dictionary.ordered_by_first_letter()[0] == Word("ache")
+
+    def test_get_words_with_first_letter(self, game_dictionary):
+        words = game_dictionary.get_words_with_first_letter("l")
+        assert [str(word) for word in words] == ["leg", "lead"]
+        assert game_dictionary.get_words_with_first_letter("z") == []
+        assert game_dictionary.get_words_with_first_letter("'") == []
+        assert game_dictionary.get_words_with_first_letter("") == []
+        assert game_dictionary.get_words_with_first_letter("le") == []
+
+    def test_get_words_with_uniques(self, game_dictionary):
+        words = game_dictionary.get_words_with_uniques(3)
+        assert [str(word) for word in words] == ["beg", "leg"]
+        assert game_dictionary.get_words_with_uniques(12) == []
+        assert game_dictionary.get_words_with_uniques(100) == []
@@ -1,8 +1,114 @@
+from pathlib import Path
+
+import pytest
+
 import lbsolve.letter_boxed_solver as lbs
 
 
+@pytest.fixture
+def mock_classes(mocker):
+    game_dictionary_class = mocker.patch.object(lbs, "GameDictionary")
+    game_dictionary = game_dictionary_class.return_value
+    game_dictionary.valid_words = 1
+    game_dictionary.invalid_words = 0
+    game_dictionary.equivalent_words = 0
+    solution_finder_class = mocker.patch.object(lbs, "SolutionFinder")
+    solver = solution_finder_class.return_value
+    solver.running.return_value = False
+    solver.get_solutions.return_value = []
+    solver._solution_candidates.linear_candidates = []
+    basic_config = mocker.patch.object(lbs.logging, "basicConfig")
+    return game_dictionary_class, solution_finder_class, basic_config
+
+
 class TestArgs:
     def test_split_letter_group(self):
         group = "abcd"
         letters = lbs.split_letter_group(group)
         assert letters == ["a", "b", "c", "d"]
+
+    def test_defaults(self, monkeypatch, mock_classes):
+        game_dictionary_class, solution_finder_class, basic_config = mock_classes
+        monkeypatch.setattr(
+            "sys.argv", ["lbsolve", "--letter_groups", "ypr", "oal", "ctn", "ise"]
+        )
+        lbs.main()
+        assert basic_config.call_args.kwargs["level"] == lbs.logging.WARNING
+        game_dictionary_class.assert_called_once_with(
+            Path("/usr/share/dict/words"),
+            [["y", "p", "r"], ["o", "a", "l"], ["c", "t", "n"], ["i", "s", "e"]],
+            merge_equivalent_words=True,
+        )
+        game_dictionary_class.return_value.create.assert_called_once_with(None)
+        solution_finder_class.assert_called_once_with(
+            game_dictionary_class.return_value,
+            0,
+            beam_width=0,
+            merge_equivalent_candidates=False,
+            shortest_only=False,
+        )
+
+    def test_flags(self, monkeypatch, mock_classes, tmp_path):
+        game_dictionary_class, solution_finder_class, basic_config = mock_classes
+        monkeypatch.setattr(
+            "sys.argv",
+            [
+                "lbsolve",
+                "--letter_groups",
+                "ypr",
+                "oal",
+                "ctn",
+                "ise",
+                "--word_file",
+                str(tmp_path / "words.txt"),
+                "--max_depth",
+                "3",
+                "--beam_width",
+                "50",
+                "--cache_dir",
+                str(tmp_path / "cache"),
+                "--keep_equivalent_words",
+                "--merge_equivalent_sequences",
+                "--shortest_only",
+                "--verbose",
+            ],
+        )
+        lbs.main()
+        assert basic_config.call_args.kwargs["level"] == lbs.logging.DEBUG
+        game_dictionary_class.assert_called_once_with(
+            tmp_path / "words.txt",
+            [["y", "p", "r"], ["o", "a", "l"], ["c", "t", "n"], ["i", "s", "e"]],
+            merge_equivalent_words=False,
+        )
+        game_dictionary_class.return_value.create.assert_called_once_with(
+            tmp_path / "cache"
+        )
+        solution_finder_class.assert_called_once_with(
+            game_dictionary_class.return_value,
+            3,
+            beam_width=50,
+            merge_equivalent_candidates=True,
+            shortest_only=True,
+        )
+
+    def test_invalid_letter_groups(self, mocker, monkeypatch, capsys, tmp_path):
+        mocker.patch.object(lbs.logging, "basicConfig")
+        word_file = tmp_path / "words.txt"
+        word_file.write_text("polynya\n")
+        monkeypatch.setattr(
+            "sys.argv",
+            [
+                "lbsolve",
+                "--letter_groups",
+                "yp1",
+                "oal",
+                "ctn",
+                "ise",
+                "--word_file",
+                str(word_file),
+            ],
+        )
+        with pytest.raises(SystemExit) as ctx:
+            lbs.main()
+        assert ctx.value.code == 2
+        assert "a to z" in capsys.readouterr().err
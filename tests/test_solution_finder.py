@@ -1,6 +1,8 @@
+import logging
+
 import pytest
 
-from lbsolve.game_dictionary import Word, WordSequence
+from lbsolve.game_dictionary import GameDictionary, Word, WordSequence
 from lbsolve.solution_finder import (
     PartialSolutionMap,
     PartialSolution,
@@ -43,6 +45,7 @@ class TestPartialSolution:
         assert new_sc.last_letter == "r"
         assert len(new_sc.unique_letters) == 4
         assert new_sc.unique_letters == {"r", "a", "c", "e"}
+        assert new_sc.mask == Word("race").mask
 
     def test_lone_and_extend_multiple(self):
         base_word = Word("rear")
@@ -56,6 +59,12 @@ class TestPartialSolution:
         assert len(sc_3.unique_letters) == 5
         assert sc_3.unique_letters == {"r", "a", "c", "e", "t"}
 
+    def test_mask(self):
+        sc = PartialSolution(WordSequence(*Word.factory("cat", "tap", "pat")))
+        assert sc.mask == Word("capt").mask
+        assert sc.unique_count == 4
+        assert sc.unique_letters == {"c", "a", "p", "t"}
+
     def test_clone_and_extend_value_error(self):
         sc = PartialSolution(WordSequence(Word("racecar")))
         with pytest.raises(ValueError) as ctx:
@@ -72,6 +81,29 @@ class TestPartialSolution:
         assert sc1 == sc2
         assert sc1 is not sc2
 
+    def test_hash(self):
+        sequence = Word.factory("cat", "tap", "pat")
+        sc1 = PartialSolution(WordSequence(*sequence))
+        sc2 = PartialSolution(WordSequence(*Word.factory("cat", "tap", "pat")))
+        assert hash(sc1) == hash(sc2)
+        assert len({sc1, sc2}) == 1
+
+    def test_clone_and_extend_equals_constructed(self):
+        cat, tap, pat = Word.factory("cat", "tap", "pat")
+        extended = PartialSolution(WordSequence(cat)).clone_and_extend(tap)
+        extended = extended.clone_and_extend(pat)
+        constructed = PartialSolution(WordSequence(cat, tap, pat))
+        assert extended == constructed
+        assert hash(extended) == hash(constructed)
+        assert len(extended) == 3
+
+    def test_contains_word(self):
+        cat, tap, pat, tip = Word.factory("cat", "tap", "pat", "tip")
+        sc = PartialSolution(WordSequence(cat, tap)).clone_and_extend(pat)
+        assert sc.contains_word(cat)
+        assert sc.contains_word(pat)
+        assert not sc.contains_word(tip)
+
     def test_to_str(self):
         words = ["cake", "eating", "guy"]
         sc = PartialSolution(WordSequence(*Word.factory(*words)))
@@ -83,18 +115,30 @@ class TestPartialSolutionMap:
         ps = PartialSolutionMap()
         ps.insert(candidates[0])
         assert ps.count == 1
-        assert ps.candidates_by_uniques_by_last_letter["t"][4] == [candidates[0]]
-        assert ps.candidates_by_last_letter_by_uniques[4]["t"] == [candidates[0]]
+        assert ps.candidates_by_mask_by_last_letter["t"] == {
+            candidates[0].mask: [candidates[0]]
+        }
         ps.insert(candidates[1])
         assert ps.count == 2
-        assert ps.candidates_by_uniques_by_last_letter["t"][4] == [
-            candidates[0],
-            candidates[1],
-        ]
-        assert ps.candidates_by_last_letter_by_uniques[4]["t"] == [
-            candidates[0],
-            candidates[1],
-        ]
+        assert ps.candidates_by_mask_by_last_letter["t"] == {
+            candidates[0].mask: [candidates[0]],
+            candidates[1].mask: [candidates[1]],
+        }
+
+    def test_extend_bucket(self, candidates):
+        ps = PartialSolutionMap()
+        ps.insert(candidates[0])
+        ps.insert(candidates[1])
+        longer = candidates[0].clone_and_extend(Word("tat"))
+        ps.extend_bucket("t", candidates[0].mask, [longer])
+        assert ps.count == 3
+        assert ps.candidates_by_mask_by_last_letter["t"] == {
+            candidates[0].mask: [candidates[0], longer],
+            candidates[1].mask: [candidates[1]],
+        }
+        assert list(ps) == [candidates[0], candidates[1], longer]
+        ps.merge([longer])
+        assert ps.count == 3
 
     def test_len(self, candidates):
         ps = PartialSolutionMap()
@@ -140,6 +184,38 @@ class TestPartialSolutionMap:
         assert ps[6, "l"] == [candidates[2]]
         assert ps[6, "t"] == [candidates[3]]
 
+    def test_candidates_with_last_letter(self, candidates):
+        ps = PartialSolutionMap()
+        for candidate in candidates:
+            ps.insert(candidate)
+        assert list(ps.candidates_with_last_letter("t")) == [
+            candidates[0],
+            candidates[1],
+            candidates[3],
+        ]
+        assert list(ps.candidates_with_last_letter("l")) == [candidates[2]]
+        assert list(ps.candidates_with_last_letter("z")) == []
+
+    def test_candidates_with_unique_count(self, candidates):
+        ps = PartialSolutionMap()
+        for candidate in candidates:
+            ps.insert(candidate)
+        assert list(ps.candidates_with_unique_count(4)) == [
+            candidates[0],
+            candidates[1],
+        ]
+        assert list(ps.candidates_with_unique_count(20)) == []
+
+    def test_candidates_below_unique_count(self, candidates):
+        ps = PartialSolutionMap()
+        for candidate in candidates:
+            ps.insert(candidate)
+        assert list(ps.candidates_below_unique_count(6)) == [
+            candidates[0],
+            candidates[1],
+        ]
+        assert list(ps.candidates_below_unique_count(4)) == []
+
     def test_getitem_by_invalid(self, candidates):
         ps = PartialSolutionMap()
         ps.insert(candidates[0])
@@ -153,6 +229,18 @@ class TestPartialSolutionMap:
             ps["t", "l"]
             assert "Provided key type is not valid." == str(ctx.value)
 
+    def test_clear(self, candidates):
+        ps = PartialSolutionMap()
+        ps.insert(candidates[0])
+        ps.insert(candidates[2])
+        ps.clear()
+        assert len(ps) == 0
+        assert list(ps) == []
+        assert ps["t"] == []
+        assert ps.candidates_by_mask_by_last_letter == {}
+        ps.merge([candidates[0]])
+        assert list(ps) == [candidates[0]]
+
     def test_merge_candidate_map(self, candidates):
         cm1 = PartialSolutionMap()
         cm1.insert(candidates[0])
@@ -176,6 +264,31 @@ class TestPartialSolutionMap:
         for index, candidate in enumerate(cm1):
             assert candidate == candidates[index]
 
+    def test_merge_equal_copies(self, candidates):
+        cm = PartialSolutionMap()
+        cm.insert(candidates[0])
+        copy = PartialSolution(WordSequence(*candidates[0].sequence))
+        cm.merge([copy, candidates[1]])
+        assert len(cm) == 2
+        assert cm.linear_candidates == [candidates[0], candidates[1]]
+
+    def test_merge_below_unique_count(self, candidates):
+        other = PartialSolutionMap()
+        for candidate in candidates:
+            other.insert(candidate)
+        cm = PartialSolutionMap()
+        cm.insert(candidates[1])
+        cm.merge(other, 6)
+        assert cm.linear_candidates == [candidates[1], candidates[0]]
+        assert cm.candidates_by_mask_by_last_letter["t"] == {
+            candidates[0].mask: [candidates[0]],
+            candidates[1].mask: [candidates[1]],
+        }
+        assert len(cm) == 2
+        cm = PartialSolutionMap()
+        cm.merge(candidates, 6)
+        assert cm.linear_candidates == [candidates[0], candidates[1]]
+
     def test_merge_list(self, candidates):
         candidate_list = [candidates[0], candidates[1]]
         ps = PartialSolutionMap()
@@ -193,6 +306,11 @@ class TestSolutionList:
         sl.insert(solutions[0])
         assert list(sl.solutions_by_words.keys())[0] == 2
         assert list(sl.solutions_by_words.keys())[1] == 3
+        sl.insert(PartialSolution(WordSequence(*Word.factory("a", "ab", "bc", "cd"))))
+        assert list(sl.solutions_by_words.keys()) == [2, 3, 4]
+        sl.insert(PartialSolution(WordSequence(Word("abc"))))
+        assert list(sl.solutions_by_words.keys()) == [1, 2, 3, 4]
+        assert [len(solution) for solution in sl] == [1, 2, 3, 4]
 
     def test_insert(self, solutions):
         sl = SolutionList()
@@ -209,6 +327,43 @@ class TestSolutionList:
         assert sl.count == 3
         assert sl.solutions_by_words[3] == [solutions[2]]
 
+    def test_extend(self, solutions):
+        sl = SolutionList()
+        sl.insert(solutions[1])
+        new_solutions = sl.extend([solutions[2], solutions[1], solutions[0]])
+        # Known solutions are skipped, and the rest are grouped by word count.
+        assert new_solutions == [solutions[2], solutions[0]]
+        assert sl.count == 3
+        assert list(sl.solutions_by_words.keys()) == [2, 3]
+        assert sl.solutions_by_words[2] == [solutions[1], solutions[0]]
+        assert sl.solutions_by_words[3] == [solutions[2]]
+        assert sl.linear_solutions == [solutions[1], solutions[2], solutions[0]]
+        assert solutions[0] in sl
+        assert sl.extend(solutions) == []
+        assert sl.count == 3
+
+    def test_snapshot(self, solutions):
+        sl = SolutionList()
+        sl.insert(solutions[2])
+        sl.insert(solutions[0])
+        snapshot = sl.snapshot()
+        assert snapshot == sl
+        assert snapshot.linear_solutions is not sl.linear_solutions
+        assert snapshot[3, 0] is solutions[2]
+        sl.insert(solutions[1])
+        assert len(snapshot) == 2
+        assert snapshot[2] == [solutions[0]]
+        assert solutions[1] not in snapshot
+
+    def test_snapshot_only_published(self, solutions):
+        sl = SolutionList()
+        sl.insert(solutions[0])
+        # A writer part way through insert has not bumped count yet.
+        sl.linear_solutions.append(solutions[1])
+        snapshot = sl.snapshot()
+        assert snapshot.linear_solutions == [solutions[0]]
+        assert len(snapshot) == 1
+
     def test_flatten(self, solutions):
         sl = SolutionList()
         sl.insert(solutions[0])
@@ -295,6 +450,36 @@ class TestSolutionFinder:
             assert len(candidate) == 1
             assert candidate.sequence[0] == mock_dictionary[index]
 
+    def test__mutate_solution_candidates_repeated_word(self, mock_game_dictionary):
+        words = Word.factory("car", "rat", "rat")
+        mock_game_dictionary.ordered_by_first_letter.return_value = words
+        sf = SolutionFinder(mock_game_dictionary)
+        sf._solution_candidates = sf._seed_candidates()
+        assert len(sf._solution_candidates) == 2
+        sf._mutate_solution_candidates()
+        assert [str(candidate) for candidate in sf._solution_candidates] == [
+            "car",
+            "rat",
+            "car-rat",
+        ]
+
+    def test__mutate_solution_candidates_frontier(self, mock_game_dictionary):
+        words = Word.factory("car", "rat", "tar")
+        mock_game_dictionary.ordered_by_first_letter.return_value = words
+        sf = SolutionFinder(mock_game_dictionary)
+        sf._solution_candidates = sf._seed_candidates()
+        sf._mutate_solution_candidates()
+        assert [str(candidate) for candidate in sf._frontier] == [
+            "car-rat",
+            "tar-rat",
+            "rat-tar",
+        ]
+        sf._mutate_solution_candidates()
+        # Only the last pass's candidates are extended, so car-rat is not made
+        # again from car.
+        assert [str(candidate) for candidate in sf._frontier] == ["car-rat-tar"]
+        assert len(sf._solution_candidates) == 7
+
     def test_start(self, mocker, mock_game_dictionary):
         mock_start = mocker.patch("lbsolve.solution_finder.Thread.start")
         sf = SolutionFinder(mock_game_dictionary)
@@ -341,18 +526,22 @@ class TestSolutionFinder:
         assert new_solutions[2][0] == solutions[0]
         assert new_solutions is not sf.solutions
         assert sf.solutions.solutions_by_words[2][0] is solutions[0]
-        assert new_solutions[2][0] is not sf.solutions.solutions_by_words[2][0]
+        assert new_solutions[2][0] is solutions[0]
+        sf.solutions.insert(solutions[1])
+        assert len(new_solutions) == 2
+        assert new_solutions[2] == [solutions[0]]
+        assert solutions[1] not in new_solutions
 
-    def test__add_new_solutions(self, solutions, mocker, mock_game_dictionary):
-        mock_print = mocker.patch("builtins.print")
+    def test__add_new_solutions(self, solutions, caplog, mock_game_dictionary):
+        caplog.set_level(logging.INFO, logger="lbsolve.solution_finder")
         sf = SolutionFinder(mock_game_dictionary)
         sf._add_new_solution(solutions[0])
         assert len(sf.solutions) == 1
         assert sf.solutions[2][0] == solutions[0]
-        mock_print.assert_called_once_with(
+        assert caplog.messages == [
             f"Found new solution: "
             f"{' - '.join([str(word) for word in sf.solutions[2][0].sequence])}"
-        )
+        ]
 
     def test_add_word_to_solution_candidates(self, solutions, candidates):
         ps = PartialSolutionMap()
@@ -364,6 +553,18 @@ class TestSolutionFinder:
             initial_word_sequence = candidates[index].sequence._word_sequence
             new_word_sequence = candidate.sequence._word_sequence
             assert new_word_sequence == initial_word_sequence + (new_word,)
+            expected = candidates[index].clone_and_extend(new_word)
+            assert candidate == expected
+            assert hash(candidate) == hash(expected)
+            assert candidate.mask == expected.mask
+            assert candidate.unique_count == expected.unique_count
+            assert candidate.depth == expected.depth
+            assert candidate.last_letter == "y"
+        # Both children use the letters of cat-tap-pat and trajectory.
+        assert new_candidates.candidates_by_mask_by_last_letter["y"] == {
+            candidates[0].mask | new_word.mask: new_candidates.linear_candidates,
+        }
+        assert len(new_candidates) == 2
 
     def test_add_word_to_solution_candidates_twice(self, solutions, candidates):
         ps = PartialSolutionMap()
@@ -379,6 +580,35 @@ class TestSolutionFinder:
         )
         assert len(no_candidates) == 0
 
+    def test_add_word_to_solution_candidates_min_unique_count(self, candidates):
+        ps = PartialSolutionMap()
+        ps.insert(candidates[0])
+        ps.insert(candidates[1])
+        new_word = Word("trot")
+        new_candidates = SolutionFinder._add_word_to_solution_candidates(
+            ps, new_word, 7
+        )
+        assert len(new_candidates) == 0
+        new_candidates = SolutionFinder._add_word_to_solution_candidates(
+            ps, new_word, 6
+        )
+        assert len(new_candidates) == 1
+        assert new_candidates.linear_candidates[0].sequence[0] == Word("cat")
+
+    def test_add_word_to_solution_candidates_no_new_letters(self, candidates):
+        ps = PartialSolutionMap()
+        ps.insert(candidates[0])
+        # tact adds no letters to cat-tap-pat and ends where it starts.
+        new_candidates = SolutionFinder._add_word_to_solution_candidates(
+            ps, Word("tact")
+        )
+        assert len(new_candidates) == 0
+        # tapa adds none either, but moves the last letter on.
+        new_candidates = SolutionFinder._add_word_to_solution_candidates(
+            ps, Word("tapa")
+        )
+        assert len(new_candidates) == 1
+
     def test__promote_candidates(self, candidates, solutions, mock_game_dictionary):
         ps = PartialSolutionMap()
         ps.insert(candidates[0])
@@ -448,6 +678,175 @@ class TestSolutionFinder:
         assert max(sf.solutions.solutions_by_words.keys()) == 6
         assert min(sf.solutions.solutions_by_words.keys()) == 3
 
+    def test__best_candidates(self, candidates):
+        best = SolutionFinder._best_candidates(candidates, 1)
+        # Three candidates end in t, and car-rip-pat has the most letters.
+        assert best == [candidates[3], candidates[2]]
+        assert SolutionFinder._best_candidates(candidates, 4) == [
+            candidates[3],
+            candidates[0],
+            candidates[1],
+            candidates[2],
+        ]
+
+    def test__get_words_by_first_letter(self, mock_game_dictionary):
+        words = Word.factory("car", "care", "cold", "dare", "car")
+        mock_game_dictionary.ordered_by_first_letter.return_value = words
+        sf = SolutionFinder(mock_game_dictionary)
+        words_by_first_letter = sf._get_words_by_first_letter()
+        assert words_by_first_letter == {
+            "c": [words[0], words[1], words[2]],
+            "d": [words[3]],
+        }
+        assert sf._max_word_unique_count == 4
+        assert sf._get_words_by_first_letter() is words_by_first_letter
+        mock_game_dictionary.ordered_by_first_letter.assert_called_once()
+
+    def test__dominant_candidates(self):
+        existing = PartialSolutionMap()
+        existing.insert(PartialSolution(WordSequence(Word("tar"))))
+        new_candidates = [
+            PartialSolution(WordSequence(*Word.factory("cart", "tar"))),
+            PartialSolution(WordSequence(*Word.factory("cat", "tar"))),
+            PartialSolution(WordSequence(*Word.factory("rat", "tar"))),
+            PartialSolution(WordSequence(*Word.factory("cat", "tic"))),
+        ]
+        dominant = SolutionFinder._dominant_candidates(new_candidates, existing)
+        # rat-tar has the same letters and last letter as tar.
+        assert dominant == [new_candidates[1], new_candidates[3]]
+
+    def test__dominant_candidates_subset(self):
+        existing = PartialSolutionMap()
+        existing.insert(PartialSolution(WordSequence(Word("cart"))))
+        new_candidates = [
+            PartialSolution(WordSequence(*Word.factory("tat", "tact"))),
+            PartialSolution(WordSequence(*Word.factory("pit", "tic"))),
+            PartialSolution(WordSequence(*Word.factory("pat", "tic"))),
+            PartialSolution(WordSequence(*Word.factory("cap", "pit"))),
+        ]
+        dominant = SolutionFinder._dominant_candidates(new_candidates, existing)
+        # tat-tact only has letters in cart, and pit-tic only has letters in
+        # pat-tic, so either is completed in as few words by the other.
+        assert dominant == [new_candidates[2], new_candidates[3]]
+
+    def test__mutate_solution_candidates_merge_equivalent(self, mock_game_dictionary):
+        words = Word.factory("car", "cold", "dare", "drain", "end", "race", "rice")
+        mock_game_dictionary.ordered_by_first_letter.return_value = words
+        sf = SolutionFinder(mock_game_dictionary, merge_equivalent_candidates=True)
+        sf._solution_candidates = sf._seed_candidates()
+        sf._mutate_solution_candidates()
+        keys = [
+            (candidate.last_letter, candidate.mask)
+            for candidate in sf._solution_candidates
+        ]
+        assert len(keys) == len(set(keys))
+        # car-race has the same letters and last letter as race.
+        assert "car-race" not in [
+            str(candidate) for candidate in sf._solution_candidates
+        ]
+
+    def test__mutate_solution_candidates_beam(self, mock_game_dictionary):
+        words = Word.factory("car", "care", "cold", "dare", "drain", "end")
+        mock_game_dictionary.ordered_by_first_letter.return_value = words
+        sf = SolutionFinder(mock_game_dictionary, beam_width=1)
+        sf._solution_candidates = sf._seed_candidates()
+        sf._mutate_solution_candidates()
+        new_candidates = sf._solution_candidates.linear_candidates[len(words) :]
+        last_letters = [candidate.last_letter for candidate in new_candidates]
+        assert sorted(last_letters) == sorted(set(last_letters))
+
+    def test__find_solutions_iterative_deepening(self, mock_game_dictionary):
+        words = Word.factory(
+            "car", "care", "cold", "could", "dare", "drain", "end", "noun", "nearby"
+        )
+        mock_game_dictionary.ordered_by_first_letter.return_value = words
+        sf = SolutionFinder(mock_game_dictionary, shortest_only=True)
+        assert sf._solver_thread._target == sf._find_solutions_iterative_deepening
+        sf._find_solutions_iterative_deepening()
+        assert [str(solution) for solution in sf.solutions] == ["could-drain-nearby"]
+
+    def test__find_solutions_iterative_deepening_should_stop(
+        self, mock_game_dictionary
+    ):
+        mock_game_dictionary.ordered_by_first_letter.return_value = Word.factory(
+            "could", "drain", "nearby"
+        )
+        sf = SolutionFinder(mock_game_dictionary, shortest_only=True)
+        sf._thread_should_stop = True
+        sf._find_solutions_iterative_deepening()
+        assert len(sf.solutions) == 0
+
+    @staticmethod
+    def _solve(word_file, max_depth=0, **options):
+        game_dictionary = GameDictionary(word_file, ("ypr", "oal", "ctn", "ise"))
+        game_dictionary.create()
+        sf = SolutionFinder(game_dictionary, max_depth, **options)
+        sf.start()
+        sf._solver_thread.join(10)
+        assert not sf.running()
+        return sf
+
+    @pytest.mark.parametrize(
+        "options",
+        [
+            {},
+            {"merge_equivalent_candidates": True},
+            {"beam_width": 2},
+            {"shortest_only": True},
+        ],
+        ids=["depth_first", "merged", "beam", "shortest_only"],
+    )
+    def test_max_depth_in_every_search(self, tmp_path, options):
+        word_file = tmp_path / "words.txt"
+        word_file.write_text(
+            "nonpeltast\ntop\nparasynaptic\nneon\nsortation\ninitiation\n"
+        )
+        # The shortest solution has three words.
+        assert len(self._solve(word_file, 2, **options).get_solutions()) == 0
+        solutions = self._solve(word_file, 3, **options).get_solutions()
+        assert [str(solution) for solution in solutions] == [
+            "nonpeltast-top-parasynaptic"
+        ]
+        solutions = self._solve(word_file, 4, **options).get_solutions()
+        assert max(len(solution) for solution in solutions) <= 4
+        assert "nonpeltast-top-parasynaptic" in map(str, solutions)
+
+    def test_breadth_first_one_word_solution(self, tmp_path):
+        word_file = tmp_path / "words.txt"
+        # Not a real word, but it uses every letter without repeating a side.
+        word_file.write_text("yocipaterlns\ntop\n")
+        for max_depth in (1, 2):
+            sf = self._solve(word_file, max_depth, merge_equivalent_candidates=True)
+            assert [str(solution) for solution in sf.get_solutions()] == [
+                "yocipaterlns"
+            ]
+
+    def test_merge_equivalent_candidates_search(self, tmp_path):
+        word_file = tmp_path / "words.txt"
+        word_file.write_text(
+            "panionic\naileron\nrecart\ntern\npiper\nnostrility\ncatasta\n"
+        )
+        full = self._solve(word_file)
+        assert [str(solution) for solution in full.get_solutions()] == [
+            "panionic-catasta-aileron-nostrility",
+            "piper-recart-tern-nostrility",
+        ]
+        # piper-recart-tern ends in the same letter as panionic-catasta-aileron
+        # and only has letters it has too, so it is not extended.
+        merged = self._solve(word_file, merge_equivalent_candidates=True)
+        assert [str(solution) for solution in merged.get_solutions()] == [
+            "panionic-catasta-aileron-nostrility",
+        ]
+        assert len(merged._solution_candidates) < len(full._solution_candidates)
+
+    def test_merge_equivalent_candidates_search_no_solutions(self, tmp_path):
+        word_file = tmp_path / "words.txt"
+        word_file.write_text("recart\ntern\nnane\n")
+        # Stops once no partial solutions are left, even without a max depth.
+        sf = self._solve(word_file, merge_equivalent_candidates=True)
+        assert len(sf.get_solutions()) == 0
+        assert len(sf._frontier) == 0
+
     def test__find_solutions_breadth_first(self, mocker, mock_game_dictionary):
         calls = 0
         solution_at_call = 5
@@ -488,7 +887,14 @@ class TestSolutionFinder:
         sf._thread_should_stop = False
         sf.max_depth = 5
         sf._find_solutions_breadth_first()
-        assert calls == sf.max_depth
+        # Each pass adds a word to the one word seeds.
+        assert calls == sf.max_depth - 1
+        assert [call.args for call in mock_mutate.call_args_list] == [
+            (3,),
+            (2,),
+            (1,),
+            (0,),
+        ]
 
     def test__find_solutions_breadth_first_should_stop(
         self, mocker, mock_game_dictionary